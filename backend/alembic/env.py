@@ -50,7 +50,6 @@ POSTGRES_PORT = '5432'
 POSTGRES_DB = loadenv("POSTGRES_DB")
 POSTGRES_USER = loadenv("POSTGRES_USER")
 POSTGRES_PASSWORD = loadsecret("db_password")
-JWT_SECRET_KEY = loadsecret("jwt_key")
 
 db_url = f'postgresql://\
 {POSTGRES_USER}:\
@@ -0,0 +1,33 @@
+"""user_sessions keyset index
+
+Revision ID: 3b9e1c7d2a45
+Revises: 82fdc03e754f
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e1c7d2a45'
+down_revision: Union[str, Sequence[str], None] = '82fdc03e754f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_user_sessions_user_id_start_time_id',
+        'user_sessions',
+        ['user_id', 'start_time', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_sessions_user_id_start_time_id', table_name='user_sessions')
@@ -0,0 +1,39 @@
+"""user_sessions archive table and start_time index
+
+Revision ID: 5e2a7f1c9b30
+Revises: c4d81f6a9e07
+Create Date: 2026-10-18 14:05:42.118903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a7f1c9b30'
+down_revision: Union[str, Sequence[str], None] = 'c4d81f6a9e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_user_sessions_start_time'), 'user_sessions', ['start_time'], unique=False)
+    op.create_table('user_sessions_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('device', sa.String(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_sessions_archive_user_id'), 'user_sessions_archive', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_sessions_archive_user_id'), table_name='user_sessions_archive')
+    op.drop_table('user_sessions_archive')
+    op.drop_index(op.f('ix_user_sessions_start_time'), table_name='user_sessions')
@@ -0,0 +1,129 @@
+"""partition user_sessions by start_time (PostgreSQL, optional)
+
+Секционирование включается явно и только в PostgreSQL:
+
+    alembic -x partition_sessions=true upgrade head
+
+Без флага ревизия отмечается применённой и ничего не меняет. Чтобы секционировать таблицу
+позже, запустите scripts/partition_sessions.py: откат к этой ревизии удалил бы таблицы и
+столбцы более поздних миграций вместе с данными. Таблица пересоздаётся с копированием всех
+строк, поэтому запускать её нужно в окно обслуживания.
+
+Секции помесячные (user_sessions_pYYYYMM) плюс user_sessions_default; новые секции создаёт,
+а целиком истёкшие переносит в архив и удаляет фоновая задача архивации сессий.
+
+Revision ID: 9d4b2e6f8a13
+Revises: 5e2a7f1c9b30
+Create Date: 2026-10-18 14:41:17.602281
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b2e6f8a13'
+down_revision: Union[str, Sequence[str], None] = '5e2a7f1c9b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 2
+INDEXES = (
+    ('ix_user_sessions_id', '(id)'),
+    ('ix_user_sessions_user_id_start_time_id', '(user_id, start_time, id)'),
+    ('ix_user_sessions_start_time', '(start_time)'),
+)
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _is_partitioned(bind) -> bool:
+    return bind.scalar(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('user_sessions'))"
+    ))
+
+
+def _swap_out(bind, new_name: str):
+    """Переименовывает текущую таблицу и освобождает имена её индексов"""
+    bind.execute(sa.text(f"ALTER TABLE user_sessions RENAME TO {new_name}"))
+    bind.execute(sa.text(f"ALTER TABLE {new_name} RENAME CONSTRAINT user_sessions_pkey TO {new_name}_pkey"))
+    for name, _ in INDEXES:
+        bind.execute(sa.text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _finish(bind, old_name: str):
+    # Последовательность принадлежала старой таблице и удалилась бы вместе с ней
+    bind.execute(sa.text("ALTER SEQUENCE user_sessions_id_seq OWNED BY user_sessions.id"))
+    bind.execute(sa.text(f"DROP TABLE {old_name}"))
+    for name, columns in INDEXES:
+        bind.execute(sa.text(f"CREATE INDEX {name} ON user_sessions {columns}"))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    enabled = context.get_x_argument(as_dictionary=True).get('partition_sessions', '').lower() in ('1', 'true', 'yes')
+    if not enabled or op.get_context().dialect.name != 'postgresql':
+        return
+    bind = op.get_bind()
+    if _is_partitioned(bind):
+        return
+
+    _swap_out(bind, 'user_sessions_unpartitioned')
+    bind.execute(sa.text(
+        "CREATE TABLE user_sessions ("
+        " id integer NOT NULL DEFAULT nextval('user_sessions_id_seq'),"
+        " user_id integer NOT NULL REFERENCES users (id),"
+        " device varchar NOT NULL,"
+        " start_time timestamp without time zone NOT NULL,"
+        " PRIMARY KEY (id, start_time)"
+        ") PARTITION BY RANGE (start_time)"
+    ))
+
+    oldest = bind.scalar(sa.text("SELECT min(start_time) FROM user_sessions_unpartitioned")) or datetime.utcnow()
+    month = date(oldest.year, oldest.month, 1)
+    last = date.today()
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        bind.execute(sa.text(
+            f"CREATE TABLE user_sessions_p{month:%Y%m} PARTITION OF user_sessions "
+            f"FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')"
+        ))
+        month = _next_month(month)
+    bind.execute(sa.text("CREATE TABLE user_sessions_default PARTITION OF user_sessions DEFAULT"))
+
+    bind.execute(sa.text(
+        "INSERT INTO user_sessions (id, user_id, device, start_time) "
+        "SELECT id, user_id, device, COALESCE(start_time, now() AT TIME ZONE 'utc') FROM user_sessions_unpartitioned"
+    ))
+    _finish(bind, 'user_sessions_unpartitioned')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    bind = op.get_bind()
+    if not _is_partitioned(bind):
+        return
+
+    _swap_out(bind, 'user_sessions_partitioned')
+    bind.execute(sa.text(
+        "CREATE TABLE user_sessions ("
+        " id integer NOT NULL DEFAULT nextval('user_sessions_id_seq'),"
+        " user_id integer NOT NULL REFERENCES users (id),"
+        " device varchar NOT NULL,"
+        " start_time timestamp without time zone,"
+        " PRIMARY KEY (id)"
+        ")"
+    ))
+    bind.execute(sa.text(
+        "INSERT INTO user_sessions (id, user_id, device, start_time) "
+        "SELECT id, user_id, device, start_time FROM user_sessions_partitioned"
+    ))
+    _finish(bind, 'user_sessions_partitioned')
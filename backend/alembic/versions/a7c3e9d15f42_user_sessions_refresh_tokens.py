@@ -0,0 +1,30 @@
+"""user_sessions refresh token hash and totp_verified
+
+Revision ID: a7c3e9d15f42
+Revises: 9d4b2e6f8a13
+Create Date: 2026-10-18 15:22:09.734015
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9d15f42'
+down_revision: Union[str, Sequence[str], None] = '9d4b2e6f8a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('user_sessions', sa.Column('refresh_token_hash', sa.String(), nullable=True))
+    op.add_column('user_sessions', sa.Column('totp_verified', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user_sessions', 'totp_verified')
+    op.drop_column('user_sessions', 'refresh_token_hash')
@@ -0,0 +1,30 @@
+"""users state_changed_at for cross-process session revocation
+
+Revision ID: b5d9e2a7c341
+Revises: f1a4d7c2b968
+Create Date: 2026-10-18 23:12:48.204615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d9e2a7c341'
+down_revision: Union[str, Sequence[str], None] = 'f1a4d7c2b968'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('state_changed_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_users_state_changed_at'), 'users', ['state_changed_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_state_changed_at'), table_name='users')
+    op.drop_column('users', 'state_changed_at')
@@ -0,0 +1,28 @@
+"""pending_totp created_at index
+
+Revision ID: c4d81f6a9e07
+Revises: 3b9e1c7d2a45
+Create Date: 2026-10-18 12:31:08.517342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d81f6a9e07'
+down_revision: Union[str, Sequence[str], None] = '3b9e1c7d2a45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_pending_totp_created_at'), 'pending_totp', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_pending_totp_created_at'), table_name='pending_totp')
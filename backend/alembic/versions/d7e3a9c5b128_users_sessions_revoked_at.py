@@ -0,0 +1,30 @@
+"""users sessions_revoked_at for cross-process session revocation
+
+Revision ID: d7e3a9c5b128
+Revises: b5d9e2a7c341
+Create Date: 2026-10-19 10:41:06.730914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e3a9c5b128'
+down_revision: Union[str, Sequence[str], None] = 'b5d9e2a7c341'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('sessions_revoked_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_users_sessions_revoked_at'), 'users', ['sessions_revoked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_sessions_revoked_at'), table_name='users')
+    op.drop_column('users', 'sessions_revoked_at')
@@ -0,0 +1,41 @@
+"""auth_events table
+
+Revision ID: e3b6c1d8f052
+Revises: a7c3e9d15f42
+Create Date: 2026-10-18 17:40:51.218364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b6c1d8f052'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e9d15f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('auth_events',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('event_type', sa.String(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('login', sa.String(), nullable=True),
+    sa.Column('ip', sa.String(), nullable=True),
+    sa.Column('session_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_auth_events_user_id_created_at', 'auth_events', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_auth_events_event_type_created_at', 'auth_events', ['event_type', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_auth_events_event_type_created_at', table_name='auth_events')
+    op.drop_index('ix_auth_events_user_id_created_at', table_name='auth_events')
+    op.drop_table('auth_events')
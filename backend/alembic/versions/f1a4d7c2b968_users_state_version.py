@@ -0,0 +1,28 @@
+"""users state_version for conditional GET
+
+Revision ID: f1a4d7c2b968
+Revises: e3b6c1d8f052
+Create Date: 2026-10-18 21:04:37.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a4d7c2b968'
+down_revision: Union[str, Sequence[str], None] = 'e3b6c1d8f052'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('state_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'state_version')
@@ -0,0 +1,126 @@
+"""Латентность /api/user, пока /api/login нагружен bcrypt.
+
+Запуск из каталога backend (нужны те же переменные окружения и секреты, что и для приложения):
+
+    python benchmarks/bench_hashing.py --logins 8 --duration 10
+    python benchmarks/bench_hashing.py --inline   # bcrypt прямо в event loop, для сравнения
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+# Все входы идут от одного логина и адреса: ограничители входа остановили бы бенчмарк
+os.environ["LOGIN_RATE_LIMIT_PER_LOGIN"] = str(10 ** 9)
+os.environ["LOGIN_RATE_LIMIT_PER_IP"] = str(10 ** 9)
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import auth
+from database import SessionLocal
+from main import app
+from models import Base, User
+from session_registry import warm_session_registry
+
+LOGIN = "bench"
+PASSWORD = "bench-password"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def login_loop(client, stop):
+    count = 0
+    while not stop.is_set():
+        response = await client.post("/api/login", json={"login": LOGIN, "password": PASSWORD})
+        assert response.status_code in (200, 503), response.text
+        count += 1
+    return count
+
+
+async def user_loop(client, headers, stop, interval):
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/user", headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.text
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def prepare(args):
+    """ASGITransport не выполняет lifespan приложения: карту сессий и пул хеширования готовим сами"""
+    async with SessionLocal() as db:
+        await warm_session_registry(db)
+    if not args.inline:
+        # Процессы пула запускаются по мере поступления задач: поднимаем все до замера
+        executor = auth.get_hash_executor()
+        await asyncio.gather(*(auth.hash_password_async(PASSWORD) for _ in range(executor._max_workers)))
+
+
+async def run(args):
+    await prepare(args)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/api/login", json={"login": LOGIN, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+        stop = asyncio.Event()
+        logins = [asyncio.create_task(login_loop(client, stop)) for _ in range(args.logins)]
+        poller = asyncio.create_task(user_loop(client, headers, stop, args.interval))
+        await asyncio.sleep(args.duration)
+        stop.set()
+
+        login_count = sum(await asyncio.gather(*logins))
+        latencies = await poller
+
+    auth.shutdown_hash_executor()
+    mode = "inline" if args.inline else "process pool"
+    print(f"mode: {mode}, concurrent logins: {args.logins}, duration: {args.duration}s")
+    print(f"logins completed: {login_count} ({login_count / args.duration:.1f}/s)")
+    print(
+        f"/api/user: n={len(latencies)} "
+        f"p50={statistics.median(latencies):.1f}ms "
+        f"p99={percentile(latencies, 99):.1f}ms "
+        f"max={max(latencies):.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=8, help="одновременных клиентов /api/login")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность, секунд")
+    parser.add_argument("--interval", type=float, default=0.01, help="пауза между запросами /api/user")
+    parser.add_argument("--inline", action="store_true", help="хешировать в event loop (поведение до пула)")
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{DB_PATH}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(login=LOGIN, password_hash=auth.get_password_hash(PASSWORD)))
+        db.commit()
+    engine.dispose()
+
+    if args.inline:
+        async def run_inline(operation, func, *func_args):
+            return func(*func_args)
+        auth._run_in_hash_executor = run_inline
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
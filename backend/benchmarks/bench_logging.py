@@ -0,0 +1,85 @@
+"""Пропускная способность логирования предупреждений на пути запроса.
+
+Сравнивает синхронный StreamHandler (как было), очередь с JSON в фоновом потоке
+и очередь с прореживанием по типу события.
+
+    python benchmarks/bench_logging.py --records 100000
+    python benchmarks/bench_logging.py --records 20000 --write-delay 50   # медленный вывод
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from logging_setup import DATE_FORMAT, PLAIN_FORMAT, EventSampler, JSONFormatter
+
+
+class SlowStream:
+    """Поток с задержкой на запись, как у stdout, упёршегося в заполненный pipe"""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, data):
+        time.sleep(self.delay)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run(mode: str, records: int, sample_rate: int, stream) -> tuple[float, float]:
+    logger = logging.getLogger(f"bench-{mode}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    output = logging.StreamHandler(stream)
+    listener = None
+    if mode == "plain":
+        output.setFormatter(logging.Formatter(PLAIN_FORMAT, DATE_FORMAT))
+        logger.addHandler(output)
+    else:
+        queue = SimpleQueue()
+        output.setFormatter(JSONFormatter())
+        logger.addHandler(QueueHandler(queue))
+        listener = QueueListener(queue, output)
+        listener.start()
+        if mode == "queue+sampling":
+            logger.addFilter(EventSampler(sample_rate))
+
+    started = time.perf_counter()
+    for i in range(records):
+        logger.warning(f'Unsuccessful login from "user-{i % 1000}"', extra={"event": "login_failed"})
+    caller = time.perf_counter() - started
+
+    if listener is not None:
+        listener.stop()
+    total = time.perf_counter() - started
+    return caller, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--sample-rate", type=int, default=20, help="предупреждений одного типа в секунду")
+    parser.add_argument("--write-delay", type=float, default=0.0, help="задержка записи в вывод, мкс")
+    args = parser.parse_args()
+
+    print(f"{'mode':<16}{'caller, rec/s':>16}{'incl. drain, rec/s':>20}")
+    for mode in ("plain", "queue", "queue+sampling"):
+        with tempfile.TemporaryFile("w") as stream:
+            if args.write_delay:
+                stream = SlowStream(stream, args.write_delay / 1e6)
+            caller, total = run(mode, args.records, args.sample_rate, stream)
+        print(f"{mode:<16}{args.records / caller:>16.0f}{args.records / total:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
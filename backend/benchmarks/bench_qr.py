@@ -0,0 +1,35 @@
+"""Размер ответа и время рендеринга QR-кода TOTP в разных форматах.
+
+    python benchmarks/bench_qr.py --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from totp_utils import generate_qr_code, generate_totp_secret, get_provisioning_uri
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    secret = generate_totp_secret()
+    login = "benchmark-user"
+    print(f"{'format':<8}{'payload, bytes':>16}{'render, ms':>12}")
+    for fmt in ("png", "svg", "uri"):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            qr_code = generate_qr_code(login, secret, fmt)
+        elapsed = (time.perf_counter() - started) / args.repeat * 1000
+
+        # Клиент в любом случае получает ещё секрет и provisioning_uri
+        payload = len(qr_code or "") + len(get_provisioning_uri(login, secret))
+        print(f"{fmt:<8}{payload:>16}{elapsed:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Стоимость ответа GET /api/sessions со списком сессий: сборка, проверка и сериализация в JSON.
+
+Сравнивает прежний путь (модели pydantic, strftime, повторная проверка response_model в FastAPI,
+json.dumps) с orjson поверх тех же моделей и со словарями, которые обработчик отдаёт сам.
+
+    python benchmarks/bench_serialization.py --sessions 1000 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from responses import ORJSONResponse, format_time
+from schemas import SessionResponse, SessionsResponse
+
+Row = namedtuple("Row", "id device start_time")
+
+
+def make_rows(count: int) -> list[Row]:
+    started = datetime(2025, 1, 1)
+    return [Row(i, f"DESKTOP-{i:08X}", started + timedelta(minutes=7 * i)) for i in range(1, count + 1)]
+
+
+async def via_models(rows, current_id, field, response_class):
+    # Как было: модели по полю, затем FastAPI проверяет и сериализует их по response_model
+    sessions = [
+        SessionResponse(
+            id=row.id,
+            device=row.device,
+            start_time=row.start_time.strftime("%H:%M %d-%m-%Y"),
+            is_current=row.id == current_id
+        )
+        for row in rows
+    ]
+    content = await serialize_response(field=field, response_content=SessionsResponse(sessions=sessions))
+    return response_class(content).body
+
+
+async def via_dicts(rows, current_id):
+    sessions = [
+        {"id": row.id, "device": row.device, "start_time": format_time(row.start_time), "is_current": row.id == current_id}
+        for row in rows
+    ]
+    return ORJSONResponse({"sessions": sessions, "next_cursor": None}).body
+
+
+async def measure(repeat: int, func, *args) -> tuple[float, bytes]:
+    body = await func(*args)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func(*args)
+    return (time.perf_counter() - started) / repeat * 1000, body
+
+
+async def run(args):
+    rows = make_rows(args.sessions)
+    current_id = rows[-1].id
+    field = create_model_field("response", SessionsResponse, mode="serialization")
+
+    variants = [
+        ("pydantic + json", via_models, rows, current_id, field, JSONResponse),
+        ("pydantic + orjson", via_models, rows, current_id, field, ORJSONResponse),
+        ("dict + orjson", via_dicts, rows, current_id),
+    ]
+    print(f"{args.sessions} sessions")
+    print(f"{'variant':<20}{'ms per response':>16}{'bytes':>10}")
+    bodies = []
+    for name, func, *func_args in variants:
+        elapsed, body = await measure(args.repeat, func, *func_args)
+        bodies.append(body)
+        print(f"{name:<20}{elapsed:>16.3f}{len(body):>10}")
+
+    # Все варианты отдают одно и то же
+    assert all(json.loads(body) == json.loads(bodies[0]) for body in bodies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
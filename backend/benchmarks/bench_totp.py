@@ -0,0 +1,51 @@
+"""Пакетная проверка TOTP против проверки по одному коду через pyotp.
+
+    python benchmarks/bench_totp.py --count 10000 --users 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import pyotp
+
+from totp_utils import verify_totp_codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000, help="число проверок")
+    parser.add_argument("--users", type=int, default=1000, help="число разных секретов в пачке")
+    args = parser.parse_args()
+
+    secrets = [pyotp.random_base32() for _ in range(args.users)]
+    items = []
+    for i in range(args.count):
+        secret = secrets[i % args.users]
+        # Половина кодов верные, половина - нет
+        code = pyotp.TOTP(secret).now() if i % 2 == 0 else "000000"
+        items.append((secret, code))
+
+    started = time.perf_counter()
+    expected = [pyotp.TOTP(secret).verify(code, valid_window=1) for secret, code in items]
+    per_call = time.perf_counter() - started
+
+    # Первый прогон с холодным кешем раскодированных секретов, второй - с тёплым
+    started = time.perf_counter()
+    results = verify_totp_codes(items)
+    batch_cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    verify_totp_codes(items)
+    batch_warm = time.perf_counter() - started
+
+    assert results == expected
+    print(f"{args.count} verifications, {args.users} secrets")
+    for name, elapsed in (("pyotp per call", per_call), ("batch, cold", batch_cold), ("batch, warm", batch_warm)):
+        print(f"{name:<16}{elapsed * 1000:>10.1f} ms{args.count / elapsed:>12.0f} /s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Подбор стоимости хеширования паролей под целевое время одного хеша на этой машине.
+
+Печатает переменные окружения для приложения. Запускать на той же машине (и с тем же
+ограничением CPU контейнера), где будет работать пул хеширования:
+
+    python scripts/calibrate_hashing.py --scheme bcrypt --target-ms 250
+    python scripts/calibrate_hashing.py --scheme argon2 --target-ms 250 --max-memory-mib 256
+"""
+import argparse
+import statistics
+import time
+
+from passlib.hash import argon2, bcrypt
+
+PASSWORD = "calibration-password"
+
+
+def measure(handler, samples: int) -> float:
+    """Медиана времени одного хеша, секунд; проверка стоит столько же"""
+    handler.hash(PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.hash(PASSWORD)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def report(params: dict, elapsed: float, mark: str = ""):
+    described = " ".join(f"{key}={value}" for key, value in params.items())
+    print(f"  {described}: {elapsed * 1000:.0f} ms {mark}".rstrip())
+
+
+def calibrate_bcrypt(target: float, samples: int) -> dict:
+    # Каждый шаг rounds удваивает время, берём последний, что укладывается в цель
+    best = {"rounds": 4}
+    for rounds in range(4, 32):
+        elapsed = measure(bcrypt.using(rounds=rounds), samples)
+        report({"rounds": rounds}, elapsed)
+        if elapsed > target:
+            break
+        best = {"rounds": rounds}
+    return {"PASSWORD_SCHEME": "bcrypt", "BCRYPT_ROUNDS": best["rounds"]}
+
+
+def calibrate_argon2(target: float, samples: int, parallelism: int, max_memory: int) -> dict:
+    # Сначала наращиваем память (она и мешает перебору на GPU), затем число проходов
+    best = {"time_cost": 2, "memory_cost": 8192}
+    memory = best["memory_cost"]
+    while memory <= max_memory:
+        elapsed = measure(argon2.using(type="ID", time_cost=2, memory_cost=memory, parallelism=parallelism), samples)
+        report({"time_cost": 2, "memory_cost": memory}, elapsed)
+        if elapsed > target:
+            break
+        best = {"time_cost": 2, "memory_cost": memory}
+        memory *= 2
+    else:
+        time_cost = 3
+        while True:
+            params = {"time_cost": time_cost, "memory_cost": best["memory_cost"]}
+            elapsed = measure(argon2.using(type="ID", parallelism=parallelism, **params), samples)
+            report(params, elapsed)
+            if elapsed > target:
+                break
+            best = params
+            time_cost += 1
+
+    return {
+        "PASSWORD_SCHEME": "argon2",
+        "ARGON2_TIME_COST": best["time_cost"],
+        "ARGON2_MEMORY_COST": best["memory_cost"],
+        "ARGON2_PARALLELISM": parallelism,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scheme", choices=("bcrypt", "argon2"), default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="целевое время одного хеша")
+    parser.add_argument("--samples", type=int, default=3, help="замеров на каждый вариант")
+    parser.add_argument("--parallelism", type=int, default=4, help="потоков argon2 на один хеш")
+    parser.add_argument("--max-memory-mib", type=int, default=256, help="предел памяти argon2 на один хеш")
+    args = parser.parse_args()
+
+    target = args.target_ms / 1000
+    print(f"{args.scheme}, target {args.target_ms:.0f} ms per hash:")
+    if args.scheme == "bcrypt":
+        result = calibrate_bcrypt(target, args.samples)
+    else:
+        result = calibrate_argon2(target, args.samples, args.parallelism, args.max_memory_mib * 1024)
+        print(
+            f"memory per hash: {result['ARGON2_MEMORY_COST'] // 1024} MiB, "
+            f"peak is that times HASH_WORKERS"
+        )
+
+    print()
+    for key, value in result.items():
+        print(f"{key}={value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Массовый импорт пользователей из CSV или JSONL.
+
+Каждая запись - login и либо password (будет захеширован текущей схемой в пуле процессов),
+либо готовый password_hash в формате, который понимает auth.pwd_context. Логины, которые уже
+есть в базе или повторяются во входном файле, пропускаются. Вход читается потоком и
+обрабатывается пачками, так что память не зависит от размера файла. В PostgreSQL пачка
+загружается через COPY во временную таблицу, в остальных базах - многострочным INSERT.
+
+Запуск из каталога backend с теми же переменными окружения и секретами, что и для alembic:
+
+    python scripts/import_users.py users.csv
+    python scripts/import_users.py users.jsonl --batch-size 10000 --workers 8
+    cat users.jsonl | python scripts/import_users.py - --format jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, make_url
+
+from auth import get_password_hash, pwd_context
+from database import DATABASE_URL
+from models import User
+
+SYNC_DRIVERS = {"postgresql": "postgresql+psycopg2", "sqlite": "sqlite"}
+INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+# Сколько отклонённых строк перечислять в отчёте; остальные только считаются
+MAX_REPORTED_INVALID = 100
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.invalid_lines = []
+        self.started = time.monotonic()
+
+    def reject(self, line: int, reason: str):
+        self.invalid += 1
+        if len(self.invalid_lines) < MAX_REPORTED_INVALID:
+            self.invalid_lines.append(f"line {line}: {reason}")
+
+    def rate(self) -> float:
+        return self.read / max(time.monotonic() - self.started, 1e-9)
+
+    def __str__(self):
+        return (
+            f"{self.read} read, {self.inserted} inserted, {self.skipped} skipped, "
+            f"{self.invalid} invalid, {self.rate():.0f} rows/s"
+        )
+
+
+def sync_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=SYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
+
+def read_records(stream, fmt: str):
+    """Тройки (номер строки, запись, ошибка разбора): битая строка не прерывает импорт"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+    else:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield number, None, f"invalid JSON ({error.msg})"
+                continue
+            if not isinstance(record, dict):
+                yield number, None, "not a JSON object"
+                continue
+            yield number, record, None
+
+
+def batches(records, size: int):
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
+
+
+def existing_logins(conn: Connection, logins: list[str]) -> set[str]:
+    # Поиск по уникальному индексу ix_users_login
+    return set(conn.scalars(select(User.login).where(User.login.in_(logins))))
+
+
+def copy_batch(conn: Connection, rows: list[dict]) -> int:
+    """COPY во временную таблицу и перенос в users без конфликтующих логинов"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((row["login"], row["password_hash"], row["created_at"].isoformat()))
+    buffer.seek(0)
+
+    conn.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS import_users_stage "
+        "(login varchar, password_hash varchar, created_at timestamp) ON COMMIT DELETE ROWS"
+    ))
+    cursor = conn.connection.dbapi_connection.cursor()
+    cursor.copy_expert("COPY import_users_stage (login, password_hash, created_at) FROM STDIN WITH (FORMAT csv)", buffer)
+    result = conn.execute(text(
+        "INSERT INTO users (login, password_hash, created_at) "
+        "SELECT login, password_hash, created_at FROM import_users_stage "
+        "ON CONFLICT (login) DO NOTHING"
+    ))
+    return result.rowcount
+
+
+def insert_batch(conn: Connection, rows: list[dict]) -> int:
+    insert = INSERTS[conn.dialect.name]
+    # Логин мог появиться с момента проверки (например, через /api/register)
+    result = conn.execute(insert(User).values(rows).on_conflict_do_nothing(index_elements=["login"]))
+    return result.rowcount
+
+
+def prepare(conn: Connection, batch: list[tuple], in_flight: set[str], stats: ImportStats):
+    """Отбрасывает дубликаты и некорректные записи, до хеширования"""
+    valid = []
+    for line, record, error in batch:
+        if error:
+            stats.reject(line, error)
+            continue
+        login, password, password_hash = (record.get(key) for key in ("login", "password", "password_hash"))
+        if not all(value is None or isinstance(value, str) for value in (login, password, password_hash)):
+            stats.reject(line, "fields must be strings")
+            continue
+        login = (login or "").strip()
+        if not login or not (password or password_hash):
+            stats.reject(line, "login and password or password_hash required")
+            continue
+        valid.append((line, login, password, password_hash))
+
+    seen = existing_logins(conn, [login for _, login, _, _ in valid]) | in_flight
+    to_hash, prehashed = [], []
+    for line, login, password, password_hash in valid:
+        if login in seen:
+            stats.skipped += 1
+            continue
+        seen.add(login)
+        if password_hash:
+            if pwd_context.identify(password_hash, required=False) is None:
+                stats.reject(line, "unknown password_hash format")
+                continue
+            prehashed.append({"login": login, "password_hash": password_hash})
+        else:
+            to_hash.append((login, password))
+    return to_hash, prehashed
+
+
+def load_batch(conn: Connection, load, prehashed: list[dict], to_hash: list, hashes, stats: ImportStats):
+    now = datetime.utcnow()
+    rows = prehashed + [
+        {"login": login, "password_hash": password_hash}
+        for (login, _), password_hash in zip(to_hash, hashes)
+    ]
+    if not rows:
+        return
+    for row in rows:
+        row["created_at"] = now
+    inserted = load(conn, rows)
+    conn.commit()
+    stats.inserted += inserted
+    stats.skipped += len(rows) - inserted
+
+
+def import_users(stream, fmt: str, database_url: str, batch_size: int = 5000,
+                 workers: int | None = None, method: str = "auto", progress=None) -> ImportStats:
+    engine = create_engine(sync_url(database_url))
+    if method == "auto":
+        method = "copy" if engine.dialect.name == "postgresql" else "insert"
+    load = copy_batch if method == "copy" else insert_batch
+    workers = workers or os.cpu_count() or 1
+
+    stats = ImportStats()
+    # Пачка N+1 хешируется в пуле, пока пачка N пишется в базу
+    pending = None
+    with engine.connect() as conn, ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in batches(read_records(stream, fmt), batch_size):
+            stats.read += len(batch)
+            in_flight = set()
+            if pending:
+                in_flight = {row["login"] for row in pending[0]} | {login for login, _ in pending[1]}
+            to_hash, prehashed = prepare(conn, batch, in_flight, stats)
+            conn.commit()
+
+            chunksize = max(1, len(to_hash) // (4 * workers))
+            hashes = executor.map(get_password_hash, [password for _, password in to_hash], chunksize=chunksize)
+            if pending:
+                load_batch(conn, load, *pending, stats)
+                if progress:
+                    progress(stats)
+            pending = (prehashed, to_hash, hashes)
+
+        if pending:
+            load_batch(conn, load, *pending, stats)
+            if progress:
+                progress(stats)
+
+    engine.dispose()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="путь к файлу или - для stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="по умолчанию - по расширению файла")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="по умолчанию - база приложения")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, help="процессов для хеширования (по умолчанию - по числу ядер)")
+    parser.add_argument("--method", choices=("auto", "copy", "insert"), default="auto")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.input.endswith(".csv") else "jsonl")
+    stream = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+
+    def progress(stats):
+        print(stats, file=sys.stderr)
+
+    with stream:
+        stats = import_users(stream, fmt, args.database_url, args.batch_size, args.workers, args.method, progress)
+    for invalid in stats.invalid_lines:
+        print(f"invalid {invalid}", file=sys.stderr)
+    if stats.invalid > len(stats.invalid_lines):
+        print(f"... and {stats.invalid - len(stats.invalid_lines)} more invalid lines", file=sys.stderr)
+    print(f"done: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,84 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
+from secrets import token_urlsafe
+from types import MappingProxyType
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
 
+from cache import TTLCache
+from jwt_keys import KeyRing, load_key_ring
+from metrics import CallbackMetric, Histogram
 from settings import settings
 
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 дней
+PASSWORD_SCHEMES = ("bcrypt", "argon2")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = getLogger('auth-logger')
+
+
+def build_pwd_context(scheme: str) -> CryptContext:
+    """Новые хеши - схемой scheme, хеши остальных схем проверяются, но считаются устаревшими"""
+    if scheme not in PASSWORD_SCHEMES:
+        raise ValueError(f"Unknown password scheme {scheme!r}")
+    return CryptContext(
+        schemes=[scheme] + [other for other in PASSWORD_SCHEMES if other != scheme],
+        deprecated="auto",
+        # min_rounds: хеши с меньшей стоимостью тоже устаревшие и пересчитываются при входе
+        bcrypt__rounds=settings.BCRYPT_ROUNDS,
+        bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+        argon2__type="ID",
+        argon2__time_cost=settings.ARGON2_TIME_COST,
+        argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+        argon2__parallelism=settings.ARGON2_PARALLELISM,
+    )
+
+
+pwd_context = build_pwd_context(settings.PASSWORD_SCHEME)
+# Ключи читаются и разбираются один раз, при первом выпуске или проверке токена;
+# смена ключей - через перезапуск процессов
+_jwt_keys: KeyRing | None = None
+
+
+class HashingQueueFull(Exception):
+    """Слишком много операций хеширования ожидают свободного процесса"""
+
+
+_hash_executor: ProcessPoolExecutor | None = None
+_hash_pending = 0
+
+# Раскодированные токены по sha256 от токена; запись живёт не дольше exp токена
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL)
+# Отклонённые токены по типу ошибки
+token_errors = Counter()
+
+HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Password hashing time including queueing", ("operation",)
+)
+CallbackMetric("password_hash_pending", "Hashing operations queued or running", lambda: _hash_pending)
+CallbackMetric(
+    "token_cache_requests_total", "Decoded JWT cache lookups",
+    lambda: {("hit",): token_cache.hits, ("miss",): token_cache.misses},
+    type="counter", labels=("result",)
+)
+CallbackMetric(
+    "token_rejected_total", "Rejected JWTs by error",
+    lambda: {(error,): count for error, count in token_errors.items()},
+    type="counter", labels=("error",)
+)
+
+
+def get_jwt_keys() -> KeyRing:
+    global _jwt_keys
+    if _jwt_keys is None:
+        _jwt_keys = load_key_ring()
+    return _jwt_keys
 
 
 def get_password_hash(password: str) -> str:
@@ -18,18 +89,149 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """(пароль верен, новый хеш или None), если хеш устарел по схеме или стоимости"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def get_hash_executor() -> ProcessPoolExecutor:
+    """Пул процессов для хеширования паролей, создаётся при первом обращении.
+
+    Процессы запускаются через forkserver, а не fork: к этому моменту в приложении уже работают
+    потоки (логирование, драйвер БД), и fork мог бы унести в дочерний процесс захваченные ими блокировки.
+    """
+    global _hash_executor
+    if _hash_executor is None:
+        workers = settings.HASH_WORKERS or os.cpu_count() or 1
+        _hash_executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _hash_executor
+
+
+def _discard_broken_executor(executor: ProcessPoolExecutor):
+    # Пул с умершим процессом отвергает все задачи; следующий вызов создаст новый
+    global _hash_executor
+    if _hash_executor is executor:
+        _hash_executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.error('Password hashing pool is broken, starting a new one', extra={"event": "hash_pool_broken"})
+
+
+def shutdown_hash_executor():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True, cancel_futures=True)
+        _hash_executor = None
+
+
+async def _run_in_hash_executor(operation: str, func, *args):
+    # Хеш пароля занимает сотни миллисекунд CPU, поэтому не выполняем его в event loop
+    global _hash_pending
+    if _hash_pending >= settings.HASH_QUEUE_LIMIT:
+        raise HashingQueueFull()
+
+    _hash_pending += 1
+    try:
+        with HASH_DURATION.time(operation):
+            loop = asyncio.get_running_loop()
+            # Процесс пула может умереть (например, OOM на argon2): один повтор на новом пуле
+            for attempt in range(2):
+                executor = get_hash_executor()
+                try:
+                    return await loop.run_in_executor(executor, func, *args)
+                except BrokenProcessPool:
+                    _discard_broken_executor(executor)
+                    if attempt:
+                        raise
+    finally:
+        _hash_pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_hash_executor("hash", get_password_hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # Проверка и пересчёт устаревшего хеша - одна задача в пуле
+    return await _run_in_hash_executor("verify", verify_and_update_password, plain_password, hashed_password)
+
+
+def access_token_lifetime() -> timedelta:
+    return timedelta(minutes=settings.ACCESS_TOKEN_TTL_MINUTES)
+
+
+def session_lifetime() -> timedelta:
+    # Сессия и её refresh-токен живут фиксированный срок от входа, без продления
+    return timedelta(days=settings.SESSION_TTL_DAYS)
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + access_token_lifetime()
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=ALGORITHM)
+    keys = get_jwt_keys()
+    encoded_jwt = jwt.encode(to_encode, keys.signing_key, algorithm=keys.algorithm, headers=keys.headers)
     return encoded_jwt
 
 
+def create_user_token(user, session_id: int, totp_verified: bool) -> str:
+    """Access-токен с данными пользователя, которых хватает для обработки запроса без БД.
+
+    user - User или Principal; claims обновляются только при выпуске нового токена.
+    """
+    return create_access_token(data={
+        "sub": str(user.id),
+        "sid": session_id,
+        "login": user.login,
+        "created": int(user.created_at.replace(tzinfo=timezone.utc).timestamp()),
+        "totp_enabled": bool(user.totp_secret),
+        "totp_verified": totp_verified,
+    })
+
+
+def new_refresh_secret() -> tuple[str, str]:
+    """Случайная часть refresh-токена и её хеш для user_sessions.refresh_token_hash"""
+    secret = token_urlsafe(32)
+    return secret, hash_refresh_secret(secret)
+
+
+def hash_refresh_secret(secret: str) -> str:
+    return sha256(secret.encode()).hexdigest()
+
+
+def format_refresh_token(session_id: int, secret: str) -> str:
+    return f"{session_id}.{secret}"
+
+
+def parse_refresh_token(token: str) -> tuple[int, str] | None:
+    """(id сессии, секрет) или None, если токен не того формата"""
+    session_id, _, secret = token.partition(".")
+    if not session_id.isdigit() or not secret:
+        return None
+    return int(session_id), secret
+
+
 def verify_token(token: str):
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[ALGORITHM])
+    # Ключ в кеше включает набор ключей, так что после удаления ключа старые записи не находятся
+    keys = get_jwt_keys()
+    cache_key = (keys.version, sha256(token.encode()).digest())
+    payload = token_cache.get(cache_key)
+    if payload is not None:
         return payload
+
+    try:
+        key = keys.get(jwt.get_unverified_header(token).get("kid"))
+        if key is None:
+            token_errors["UnknownKeyId"] += 1
+            return None
+        # Алгоритм берётся из ключа, а не из заголовка токена
+        payload = jwt.decode(token, key.key, algorithms=[key.algorithm])
     except JWTError as error:
-        print(error)
+        token_errors[type(error).__name__] += 1
         return None
+
+    payload = MappingProxyType(payload)
+    exp = payload.get("exp")
+    token_cache.set(cache_key, payload, exp - time.time() if exp else None)
+    return payload
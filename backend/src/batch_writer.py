@@ -0,0 +1,142 @@
+import asyncio
+from logging import getLogger
+
+from sqlalchemy import Table, insert
+
+from database import SessionLocal
+from metrics import CallbackMetric, Counter, Histogram
+
+
+logger = getLogger('tasks-logger')
+
+BATCH_ROWS = Counter("batch_writer_rows_total", "Rows handled by write-behind batch writers", ("table", "result"))
+BATCH_FLUSH_DURATION = Histogram("batch_writer_flush_seconds", "Write-behind batch insert time", ("table",))
+
+_writers = []
+
+CallbackMetric(
+    "batch_writer_pending", "Rows waiting in write-behind batch writers",
+    lambda: {(writer.table.name,): len(writer) for writer in _writers}, labels=("table",)
+)
+
+
+class BatchWriter:
+    """Копит строки в памяти и пишет их в таблицу многострочным INSERT из фоновой задачи.
+
+    Пачка уходит в базу, когда набралось max_batch строк или через interval секунд после
+    первой строки в пустом буфере. Строки, не записанные из-за ошибки, логируются и не повторяются.
+    before_commit(db, rows) выполняется в транзакции пачки после вставки, on_error(rows) -
+    после неудачной записи.
+    """
+
+    def __init__(
+        self, table: Table, max_batch: int, interval: float, max_pending: int, before_commit=None, on_error=None
+    ):
+        self.table = table
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self.before_commit = before_commit
+        self.on_error = on_error
+        self._rows = []
+        self._waiters = []
+        self._task: asyncio.Task | None = None
+        _writers.append(self)
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        # Примитивы asyncio создаются в цикле событий приложения
+        self._has_rows = asyncio.Event()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает фоновую задачу и дописывает всё, что осталось в буфере"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+        self._task = None
+
+    async def write(self, row: dict, wait: bool = False):
+        """Ставит строку в буфер; с wait=True возвращается после коммита пачки с этой строкой"""
+        if len(self._rows) >= self.max_pending:
+            # База не успевает: пишущий ждёт вместе с пачкой, а не растит буфер
+            await self.flush()
+
+        self._append(row)
+
+        if wait:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    def offer(self, row: dict) -> bool:
+        """Ставит строку в буфер без ожидания; False, если writer не запущен или буфер полон.
+
+        Для записей, которые не должны задерживать запрос: при перегрузке они теряются.
+        """
+        if self._task is None or len(self._rows) >= self.max_pending:
+            BATCH_ROWS.inc(self.table.name, "dropped")
+            return False
+        self._append(row)
+        return True
+
+    def _append(self, row: dict):
+        self._rows.append(row)
+        self._has_rows.set()
+        if len(self._rows) >= self.max_batch:
+            self._full.set()
+
+    async def flush(self):
+        """Записывает всё, что поставлено в буфер до вызова, включая пачку, которая пишется сейчас"""
+        if self._task is None:
+            return
+        async with self._lock:
+            rows, waiters = self._rows, self._waiters
+            self._rows, self._waiters = [], []
+            self._has_rows.clear()
+            self._full.clear()
+            if not rows:
+                return
+
+            try:
+                with BATCH_FLUSH_DURATION.time(self.table.name):
+                    async with SessionLocal() as db:
+                        await db.execute(insert(self.table), rows)
+                        if self.before_commit is not None:
+                            await self.before_commit(db, rows)
+                        await db.commit()
+            except Exception as error:
+                BATCH_ROWS.inc(self.table.name, "failed", amount=len(rows))
+                logger.exception(f'Failed to write {len(rows)} rows to "{self.table.name}"')
+                if self.on_error is not None:
+                    self.on_error(rows)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(error)
+                return
+
+            BATCH_ROWS.inc(self.table.name, "written", amount=len(rows))
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def _run(self):
+        while True:
+            await self._has_rows.wait()
+            # Даём пачке набраться, но не дольше interval
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            # При остановке пачка дописывается, а stop() дождётся её через блокировку
+            await asyncio.shield(self.flush())
@@ -1,14 +1,70 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from time import perf_counter
 
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from metrics import Histogram
 from settings import settings
 
-DATABASE_URL = f'postgresql://\
+# URL и параметры пула фиксируются при импорте модуля: движок создаётся один раз на процесс
+DATABASE_URL = settings.DATABASE_URL or f'postgresql+asyncpg://\
 {settings.POSTGRES_USER}:\
 {settings.POSTGRES_PASSWORD}@\
 {settings.POSTGRES_HOST}:\
 {settings.POSTGRES_PORT}/\
 {settings.POSTGRES_DB}'
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+QUERY_DURATION = Histogram("db_query_duration_seconds", "Database statement execution time", ("statement",))
+POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет ожидание свободного соединения"""
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(perf_counter() - started)
+
+
+def engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        # aiosqlite держит по потоку на соединение, пул ему не нужен
+        return {"poolclass": NullPool}
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if url.startswith("postgresql+asyncpg"):
+        options["connect_args"] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def instrument_engine(engine):
+    """Число и длительность запросов через события SQLAlchemy"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        QUERY_DURATION.observe(perf_counter() - started, statement.split(None, 1)[0].upper())
+
+
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
@@ -1,28 +1,29 @@
-from fastapi import Depends, HTTPException, status
+from hmac import compare_digest
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import SessionLocal
 from auth import verify_token
 from models import User
+from principals import Principal, TokenIdentity, principal_cache
+from settings import settings
+from session_registry import is_session_active
 
 
 security = HTTPBearer()
 
 
 # Dependency для получения DB сессии
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-# Dependency для получения текущего пользователя
-def get_current_user(
+# Dependency для проверки токена: подпись, срок и то, что его сессия не завершена
+async def get_token_payload(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     token = credentials.credentials
     payload = verify_token(token)
@@ -32,10 +33,64 @@ def get_current_user(
             detail="Invalid authentication credentials"
         )
 
-    user = db.query(User).filter(User.id == payload.get("sub")).first()
+    if not await is_session_active(db, payload.get("sid"), payload.get("sub")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session has been terminated"
+        )
+    return payload
+
+
+# Dependency для получения id сессии, к которой привязан токен
+async def get_current_session_id(payload=Depends(get_token_payload)) -> int:
+    return payload["sid"]
+
+
+# Dependency для пользователя из claims токена, без БД; при включённом TOTP нужен пройденный второй фактор
+async def get_current_identity(payload=Depends(get_token_payload)) -> TokenIdentity:
+    identity = TokenIdentity.from_payload(payload)
+    if identity is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+    if identity.totp_enabled and not identity.totp_verified:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="TOTP verification required"
+        )
+    return identity
+
+
+# Dependency для получения текущего пользователя (нужен секрет TOTP): из кеша, при промахе - из БД
+async def get_current_user(
+    payload=Depends(get_token_payload),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    sub = payload.get("sub")
+    user_id = int(sub) if str(sub).isdigit() else None
+
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    user = await db.get(User, user_id) if user_id is not None else None
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
-    return user
+
+    principal = Principal.from_user(user)
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+# Dependency для сервисных запросов от шлюза
+async def require_gateway_key(x_gateway_key: str = Header(default="")):
+    expected = settings.TOTP_GATEWAY_KEY
+    if not expected or not compare_digest(x_gateway_key.encode(), expected.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid gateway key"
+        )
@@ -0,0 +1,139 @@
+"""Ключи подписи JWT.
+
+Токены подписываются закрытым ключом (RS256 или ES256/384/512 - по типу ключа) и несут
+в заголовке kid - отпечаток открытого ключа по RFC 7638. Открытые ключи публикуются в
+/.well-known/jwks.json, чтобы другие сервисы проверяли токены сами.
+Без закрытого ключа используется прежняя подпись HS256 общим секретом jwt_key. С закрытым
+ключом общий секрет принимается только при JWT_LEGACY_HS256 - на время перехода на ключи.
+"""
+import json
+from base64 import urlsafe_b64encode
+from hashlib import sha256
+
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+from jose import jwk
+from jose.backends.base import Key
+
+from settings import settings
+
+HMAC_ALGORITHM = "HS256"
+
+_EC_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+# Поля JWK, от которых считается отпечаток (RFC 7638)
+_THUMBPRINT_FIELDS = {"RSA": ("e", "kty", "n"), "EC": ("crv", "kty", "x", "y")}
+
+
+def key_algorithm(key) -> str:
+    """Алгоритм подписи по типу ключа cryptography (закрытого или открытого)"""
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        algorithm = _EC_ALGORITHMS.get(key.curve.name)
+        if algorithm:
+            return algorithm
+        raise ValueError(f"Unsupported elliptic curve {key.curve.name}")
+    # Ed25519 и прочие: python-jose умеет подписывать только RSA, EC и HMAC
+    raise ValueError(f"Unsupported JWT key type {type(key).__name__}")
+
+
+def split_pem(data: str) -> list[str]:
+    """Разбивает файл с несколькими PEM-блоками на отдельные ключи"""
+    blocks = []
+    for block in data.split("-----BEGIN ")[1:]:
+        end = block.index("-----END ")
+        end = block.index("-----", end + len("-----END ")) + len("-----")
+        blocks.append("-----BEGIN " + block[:end])
+    return blocks
+
+
+def thumbprint(public_jwk: dict) -> str:
+    fields = _THUMBPRINT_FIELDS[public_jwk["kty"]]
+    canonical = json.dumps({field: public_jwk[field] for field in fields}, separators=(",", ":"), sort_keys=True)
+    return urlsafe_b64encode(sha256(canonical.encode()).digest()).rstrip(b"=").decode()
+
+
+class VerificationKey:
+    __slots__ = ("kid", "algorithm", "key", "jwk")
+
+    def __init__(self, kid: str | None, algorithm: str, key: Key, public_jwk: dict | None):
+        self.kid = kid
+        self.algorithm = algorithm
+        # Разобранный объект ключа: jose не парсит PEM на каждый токен
+        self.key = key
+        self.jwk = public_jwk
+
+
+def _asymmetric_key(pem: str, private: bool) -> tuple[Key, VerificationKey]:
+    loaded = load_pem_private_key(pem.encode(), password=None) if private else load_pem_public_key(pem.encode())
+    algorithm = key_algorithm(loaded)
+    key = jwk.construct(pem, algorithm)
+    public = key.public_key() if private else key
+    public_jwk = {k: v.decode() if isinstance(v, bytes) else v for k, v in public.to_dict().items()}
+    kid = thumbprint(public_jwk)
+    public_jwk.update(kid=kid, use="sig", alg=algorithm)
+    return key, VerificationKey(kid, algorithm, public, public_jwk)
+
+
+class KeyRing:
+    """Ключ подписи и все ключи, которыми принимаются токены.
+
+    Смена ключа без простоя: новый открытый ключ сначала добавляется в jwt_public_keys
+    (его успевают получить через JWKS), затем становится ключом подписи, а старый открытый
+    остаётся в jwt_public_keys, пока не истекут подписанные им токены.
+    """
+
+    def __init__(
+        self,
+        private_pem: str | None = None,
+        public_pems: str | None = None,
+        secret: str | None = None,
+        legacy_secret: bool = False,
+    ):
+        self._keys: dict[str | None, VerificationKey] = {}
+        self.signing_key = self.signing_kid = None
+        # Вместо kid у общего секрета в версию набора идёт его отпечаток
+        secret_id = ""
+        private_pems = split_pem(private_pem or "")
+
+        # При закрытом ключе общий секрет - только для перехода: иначе любой его владелец
+        # продолжал бы выпускать токены, которые мы принимаем
+        if secret and (not private_pems or legacy_secret):
+            # Токены без kid - подписанные общим секретом, в том числе выпущенные до перехода на ключи
+            hmac_key = jwk.construct(secret, HMAC_ALGORITHM)
+            self._keys[None] = VerificationKey(None, HMAC_ALGORITHM, hmac_key, None)
+            self.signing_key, self.algorithm = hmac_key, HMAC_ALGORITHM
+            secret_id = sha256(secret.encode()).hexdigest()
+
+        for pem in split_pem(public_pems or ""):
+            _, verification = _asymmetric_key(pem, private=False)
+            self._keys[verification.kid] = verification
+
+        if len(private_pems) > 1:
+            raise ValueError("jwt_private_key must contain exactly one key")
+        if private_pems:
+            self.signing_key, verification = _asymmetric_key(private_pems[0], private=True)
+            self._keys[verification.kid] = verification
+            self.signing_kid, self.algorithm = verification.kid, verification.algorithm
+
+        if self.signing_key is None:
+            raise ValueError("jwt_private_key or jwt_key must be set in secrets!")
+
+        # Меняется вместе с набором ключей; входит в ключ кеша проверенных токенов
+        self.version = tuple(sorted(kid or secret_id for kid in self._keys))
+        self.jwks = {"keys": [key.jwk for key in self._keys.values() if key.jwk is not None]}
+
+    @property
+    def headers(self) -> dict | None:
+        return {"kid": self.signing_kid} if self.signing_kid else None
+
+    def get(self, kid) -> VerificationKey | None:
+        if kid is not None and not isinstance(kid, str):
+            return None
+        return self._keys.get(kid)
+
+
+def load_key_ring() -> KeyRing:
+    return KeyRing(
+        settings.JWT_PRIVATE_KEY, settings.JWT_PUBLIC_KEYS, settings.JWT_SECRET_KEY, settings.JWT_LEGACY_HS256
+    )
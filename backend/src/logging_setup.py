@@ -0,0 +1,116 @@
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from time import monotonic
+
+from metrics import CallbackMetric
+
+# Логгеры роутов, предупреждения которых прореживаются во время атак
+SAMPLED_LOGGERS = ('user-logger', 'totp-logger', 'sessions-logger')
+
+PLAIN_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class JSONFormatter(logging.Formatter):
+    """Одна запись - одна JSON-строка"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            data["event"] = event
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class EventSampler(logging.Filter):
+    """Пропускает не больше rate предупреждений в секунду на тип события.
+
+    Тип события берётся из extra={"event": ...}, отброшенные записи считаются,
+    и их число попадает в поле suppressed следующей пропущенной записи того же типа.
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+        self._windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+
+        key = (record.name, getattr(record, "event", None))
+        second = int(monotonic())
+        window = self._windows.get(key)
+        if window is None or window[0] != second:
+            suppressed = window[2] if window is not None else 0
+            window = self._windows[key] = [second, 0, suppressed]
+
+        if window[1] >= self.rate:
+            window[2] += 1
+            self.dropped += 1
+            return False
+
+        window[1] += 1
+        if window[2]:
+            record.suppressed = window[2]
+            window[2] = 0
+        return True
+
+
+log_queue = SimpleQueue()
+_listener: QueueListener | None = None
+_listener_running = False
+_sampler: EventSampler | None = None
+
+CallbackMetric(
+    "log_records_dropped_total", "Warnings dropped by sampling",
+    lambda: _sampler.dropped if _sampler is not None else 0, type="counter"
+)
+
+
+def configure_logging(mode: str = "plain", sample_rate: int = 0, level: int = logging.INFO):
+    """plain - синхронный вывод как раньше, queue - JSON через очередь и фоновый поток"""
+    global _listener, _sampler
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    if sample_rate > 0:
+        _sampler = EventSampler(sample_rate)
+        for name in SAMPLED_LOGGERS:
+            logging.getLogger(name).addFilter(_sampler)
+
+    if mode == "queue":
+        output = logging.StreamHandler()
+        output.setFormatter(JSONFormatter())
+        root.handlers = [QueueHandler(log_queue)]
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    else:
+        logging.basicConfig(level=level, format=PLAIN_FORMAT, datefmt=DATE_FORMAT)
+
+
+def start_logging():
+    global _listener_running
+    if _listener is not None and not _listener_running:
+        _listener.start()
+        _listener_running = True
+
+
+def stop_logging():
+    """Дописывает всё из очереди; вызывать при остановке приложения"""
+    global _listener_running
+    if _listener is not None and _listener_running:
+        _listener.stop()
+        _listener_running = False
@@ -1,19 +1,87 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from logging import basicConfig, INFO
+from fastapi.responses import Response
 
-from routes import sessions, totp, user
+from auth import HashingQueueFull, get_jwt_keys, shutdown_hash_executor
+from auth_events import event_writer
+from database import engine, SessionLocal
+from session_registry import warm_session_registry
+from session_store import session_writer
+from settings import settings
+from logging_setup import configure_logging, start_logging, stop_logging
+from tasks import (
+    run_periodically, purge_expired_pending_totp, archive_expired_sessions, purge_old_auth_events,
+    poll_user_changes, refresh_session_registry
+)
+from metrics import CONTENT_TYPE, MetricsMiddleware, render
+from responses import ORJSONResponse
+from routes import events, sessions, totp, user
 
 
-# Configure basic logging
-basicConfig(
-    level=INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+# Configure logging
+configure_logging(settings.LOG_MODE, settings.LOG_SAMPLE_RATE)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_logging()
+    async with SessionLocal() as db:
+        await warm_session_registry(db)
+
+    if settings.SESSION_WRITE_MODE != "sync":
+        session_writer.start()
+    event_writer.start()
+
+    background_tasks = []
+    if settings.SESSION_CHANGES_POLL_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(run_periodically(
+            settings.SESSION_CHANGES_POLL_INTERVAL,
+            poll_user_changes,
+            delay=settings.SESSION_CHANGES_POLL_INTERVAL
+        )))
+    if settings.SESSION_REGISTRY_REFRESH_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(run_periodically(
+            settings.SESSION_REGISTRY_REFRESH_INTERVAL,
+            refresh_session_registry,
+            delay=settings.SESSION_REGISTRY_REFRESH_INTERVAL
+        )))
+    if settings.BACKGROUND_JOBS:
+        background_tasks += [
+            asyncio.create_task(run_periodically(
+                settings.PENDING_TOTP_SWEEP_INTERVAL,
+                purge_expired_pending_totp,
+                settings.PENDING_TOTP_SWEEP_BATCH
+            )),
+            asyncio.create_task(run_periodically(
+                settings.SESSION_ARCHIVE_INTERVAL,
+                archive_expired_sessions,
+                settings.SESSION_ARCHIVE_BATCH
+            )),
+            asyncio.create_task(run_periodically(
+                settings.AUTH_EVENTS_PURGE_INTERVAL,
+                purge_old_auth_events,
+                settings.AUTH_EVENTS_PURGE_BATCH
+            )),
+        ]
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # Дописываем отложенные сессии и события, пока движок ещё открыт
+    await session_writer.stop()
+    await event_writer.stop()
+    shutdown_hash_executor()
+    await engine.dispose()
+    stop_logging()
+
 
 # Initialise application
-app = FastAPI()
+# Ответы по умолчанию сериализуются orjson
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -24,11 +92,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(user.router, prefix='/api', tags=['Users'])
 app.include_router(sessions.router, prefix='/api/sessions', tags=['Sessions'])
 app.include_router(totp.router, prefix='/api/totp', tags=['TOTP'])
+app.include_router(events.router, prefix='/api/events', tags=['Events'])
+
+
+@app.exception_handler(HashingQueueFull)
+async def hashing_queue_full_handler(request: Request, exc: HashingQueueFull):
+    return ORJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.get("/.well-known/jwks.json", include_in_schema=False)
+async def jwks():
+    # Набор ключей не меняется до перезапуска; другие сервисы могут кешировать его ненадолго
+    return ORJSONResponse(get_jwt_keys().jwks, headers={"Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE}"})
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(render(), media_type=CONTENT_TYPE)
 
 
 if __name__ == "__main__":
+    # Один процесс для разработки; в production - src/server.py
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, )
@@ -0,0 +1,163 @@
+"""Минимальные метрики в текстовом формате Prometheus, без внешних зависимостей.
+
+Запись метрики - несколько операций со словарём в том же потоке, всё форматирование
+происходит только при запросе /metrics.
+"""
+from bisect import bisect_left
+from time import perf_counter
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы корзин гистограмм по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in self._values.items():
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        # [счётчики по корзинам..., +Inf, сумма]
+        state = self._values.get(label_values)
+        if state is None:
+            state = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def samples(self):
+        for label_values, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), state):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket", _format_labels(self.labels, label_values, le), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labels, label_values), state[-1]
+            yield f"{self.name}_count", _format_labels(self.labels, label_values), cumulative
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.started, *self.label_values)
+
+
+class CallbackMetric:
+    """Значение читается функцией в момент запроса /metrics - для счётчиков, которые уже где-то хранятся.
+
+    func возвращает число или словарь {кортеж значений меток: число}.
+    """
+
+    def __init__(self, name: str, documentation: str, func, type: str = "gauge", labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.type = type
+        self.labels = labels
+        _registry.append(self)
+
+    def samples(self):
+        value = self.func()
+        if isinstance(value, dict):
+            for label_values, item in value.items():
+                yield self.name, _format_labels(self.labels, label_values), item
+        else:
+            yield self.name, "", value
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: время ответа по шаблону маршрута, а не по конкретному пути"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_DURATION.observe(
+                perf_counter() - started,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status_code,
+            )
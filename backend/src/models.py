@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, DateTime, ForeignKey, Index, false
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
@@ -13,7 +13,7 @@ class PendingTotp(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
     pending_totp_secret = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     user = relationship("User", back_populates="pending_totp")
 
@@ -26,6 +26,13 @@ class User(Base):
     password_hash = Column(String, nullable=False)
     totp_secret = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Растёт при каждом изменении сессий или TOTP пользователя - основа ETag
+    state_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Когда пользователь включал TOTP: по нему процессы сбрасывают его из кеша пользователей
+    state_changed_at = Column(DateTime, nullable=True, index=True)
+    # Когда сессии пользователя последний раз удалялись: по нему процессы узнают о завершённых
+    # сессиях; вход и создание сессий эту метку не трогают
+    sessions_revoked_at = Column(DateTime, nullable=True, index=True)
 
     sessions = relationship("UserSession", back_populates="user")
     pending_totp = relationship("PendingTotp", back_populates="user", uselist=False)
@@ -37,6 +44,47 @@ class UserSession(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     device = Column(String, nullable=False)
-    start_time = Column(DateTime, default=datetime.utcnow)
+    start_time = Column(DateTime, default=datetime.utcnow, index=True)
+    # sha256 от секрета текущего refresh-токена, меняется при каждом обновлении
+    refresh_token_hash = Column(String, nullable=True)
+    # Второй фактор пройден в этой сессии
+    totp_verified = Column(Boolean, nullable=False, default=False, server_default=false())
 
     user = relationship("User", back_populates="sessions")
+
+    __table_args__ = (
+        # Постраничный вывод сессий пользователя по (start_time, id)
+        Index("ix_user_sessions_user_id_start_time_id", "user_id", "start_time", "id"),
+    )
+
+
+class UserSessionArchive(Base):
+    """Сессии старше срока жизни токена, переносятся сюда из user_sessions фоновой задачей"""
+    __tablename__ = "user_sessions_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    device = Column(String, nullable=False)
+    start_time = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AuthEvent(Base):
+    """Журнал событий безопасности: только вставки пачками и удаление по сроку хранения"""
+    __tablename__ = "auth_events"
+
+    # В SQLite автоинкремент есть только у INTEGER PRIMARY KEY
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    event_type = Column(String, nullable=False)
+    # Без внешних ключей: события переживают пользователей и сессии, а неудачный вход может быть без пользователя
+    user_id = Column(Integer, nullable=True)
+    login = Column(String, nullable=True)
+    ip = Column(String, nullable=True)
+    session_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        # События пользователя и события одного типа по времени
+        Index("ix_auth_events_user_id_created_at", "user_id", "created_at"),
+        Index("ix_auth_events_event_type_created_at", "event_type", "created_at"),
+    )
@@ -0,0 +1,21 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(created: datetime, row_id: int) -> str:
+    """Курсор постраничного вывода по ключу (время, id)"""
+    return urlsafe_b64encode(f"{created.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created, row_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created), int(row_id)
+    except (Base64Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from cache import TTLCache
+from metrics import CallbackMetric
+from models import User
+from settings import settings
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Неизменяемый снимок пользователя, достаточный для обработки запроса"""
+    id: int
+    login: str
+    totp_secret: str | None
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            login=user.login,
+            totp_secret=user.totp_secret,
+            created_at=user.created_at,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class TokenIdentity:
+    """Пользователь по claims access-токена - без обращения к БД и кешу"""
+    id: int
+    session_id: int
+    login: str
+    created_at: datetime
+    totp_enabled: bool
+    totp_verified: bool
+
+    @classmethod
+    def from_payload(cls, payload) -> "TokenIdentity | None":
+        """None для токенов без нужных claims (выпущенных до их появления)"""
+        try:
+            return cls(
+                id=int(payload["sub"]),
+                session_id=payload["sid"],
+                login=payload["login"],
+                created_at=datetime.utcfromtimestamp(payload["created"]),
+                totp_enabled=payload["totp_enabled"],
+                totp_verified=payload["totp_verified"],
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+
+# Пользователи для маршрутов, которым нужна строка users (секрет TOTP). О включении TOTP
+# в другом процессе кеш узнаёт из poll_user_changes (users.state_changed_at)
+principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+CallbackMetric(
+    "principal_cache_requests_total", "Authenticated user cache lookups",
+    lambda: {("hit",): principal_cache.hits, ("miss",): principal_cache.misses},
+    type="counter", labels=("result",)
+)
+CallbackMetric("principal_cache_size", "Cached authenticated users", lambda: len(principal_cache))
+
+
+def invalidate_principal(user_id: int):
+    """Вызывать после изменения пользователя, которое видно в Principal"""
+    principal_cache.invalidate(user_id)
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from time import monotonic
+
+from metrics import CallbackMetric
+from settings import settings
+
+
+class SlidingWindowLimiter:
+    """Ограничение частоты по ключу: приближённое скользящее окно.
+
+    На ключ хранятся только номер окна и два счётчика (текущее и предыдущее окно),
+    оценка числа запросов за последние window секунд - взвешенная сумма этих счётчиков.
+    Таблица ограничена max_keys записями, дольше всех не встречавшиеся ключи вытесняются.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._table = OrderedDict()
+
+    def hit(self, key, now: float | None = None) -> float:
+        """Учитывает попытку; возвращает 0, если она разрешена, иначе через сколько секунд повторить"""
+        now = monotonic() if now is None else now
+        window_index, elapsed = divmod(now, self.window)
+        window_index = int(window_index)
+
+        current = previous = 0
+        entry = self._table.get(key)
+        if entry is not None:
+            if entry[0] == window_index:
+                current, previous = entry[1], entry[2]
+            elif entry[0] == window_index - 1:
+                previous = entry[1]
+
+        weight = 1 - elapsed / self.window
+        if previous * weight + current >= self.limit:
+            self.rejected += 1
+            self._store(key, (window_index, current, previous))
+            # Не раньше конца текущего окна: тогда вес старых попыток начнёт убывать
+            return max(1.0, self.window - elapsed)
+
+        self._store(key, (window_index, current + 1, previous))
+        return 0
+
+    def _store(self, key, entry):
+        self._table[key] = entry
+        self._table.move_to_end(key)
+        while len(self._table) > self.max_keys:
+            self._table.popitem(last=False)
+
+    def clear(self):
+        self._table.clear()
+
+    def __len__(self):
+        return len(self._table)
+
+
+# Лимиты читаются при импорте модуля; в тестах меняют атрибуты самих ограничителей
+login_limiter = SlidingWindowLimiter(
+    limit=settings.LOGIN_RATE_LIMIT_PER_LOGIN,
+    window=settings.LOGIN_RATE_WINDOW,
+    max_keys=settings.LOGIN_RATE_MAX_KEYS,
+)
+ip_limiter = SlidingWindowLimiter(
+    limit=settings.LOGIN_RATE_LIMIT_PER_IP,
+    window=settings.LOGIN_RATE_WINDOW,
+    max_keys=settings.LOGIN_RATE_MAX_KEYS,
+)
+
+CallbackMetric(
+    "login_rate_limit_keys", "Keys tracked by the login rate limiters",
+    lambda: {("login",): len(login_limiter), ("ip",): len(ip_limiter)},
+    labels=("limiter",)
+)
+CallbackMetric(
+    "login_rate_limited_total", "Login attempts rejected by the rate limiters",
+    lambda: {("login",): login_limiter.rejected, ("ip",): ip_limiter.rejected},
+    type="counter", labels=("limiter",)
+)
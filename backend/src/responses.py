@@ -0,0 +1,65 @@
+"""JSON-ответы через orjson.
+
+ORJSONResponse - класс ответа приложения по умолчанию. Обработчики частых запросов собирают
+словарь из уже проверенных данных (строк из БД, claims токена) и возвращают ORJSONResponse
+сами: FastAPI не валидирует и не сериализует такой ответ повторно, а response_model маршрута
+остаётся только для схемы OpenAPI.
+
+Частые опросы /api/user и /api/sessions отвечают 304 по If-None-Match: ETag строится из
+того, от чего зависит тело (claims токена, users.state_version), без чтения самих данных.
+"""
+from datetime import datetime
+from hashlib import blake2b
+
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+from metrics import Counter
+
+# Браузер хранит ответ, но каждый раз перепроверяет его по ETag
+REVALIDATE = {"Cache-Control": "private, no-cache"}
+
+CONDITIONAL_REQUESTS = Counter(
+    "http_conditional_requests_total", "Responses to pollable GETs by ETag outcome", ("route", "result")
+)
+
+
+def format_time(value: datetime) -> str:
+    """Время как strftime("%H:%M %d-%m-%Y"), но без разбора шаблона на каждой строке"""
+    return f"{value.hour:02d}:{value.minute:02d} {value.day:02d}-{value.month:02d}-{value.year:04d}"
+
+
+def format_date(value: datetime) -> str:
+    """Дата как strftime("%d-%m-%Y")"""
+    return f"{value.day:02d}-{value.month:02d}-{value.year:04d}"
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из частей, от которых зависит тело ответа"""
+    digest = blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с одним из значений If-None-Match (слабое сравнение, как для GET)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def conditional(request: Request, route: str, etag: str) -> Response | None:
+    """Ответ 304, если у клиента актуальная версия; иначе None и тело собирается как обычно.
+
+    Исход считается в http_conditional_requests_total{result="hit"|"miss"|"none"}:
+    none - запрос без If-None-Match.
+    """
+    if etag_matches(request, etag):
+        CONDITIONAL_REQUESTS.inc(route, "hit")
+        return Response(status_code=304, headers={"ETag": etag, **REVALIDATE})
+    CONDITIONAL_REQUESTS.inc(route, "miss" if "if-none-match" in request.headers else "none")
+    return None
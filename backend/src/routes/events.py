@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth_events import EVENT_TYPES
+from dependencies import get_db, get_current_identity
+from models import AuthEvent
+from pagination import decode_cursor, encode_cursor
+from principals import TokenIdentity
+from responses import ORJSONResponse
+from schemas import AuthEventsResponse
+
+
+router = APIRouter(redirect_slashes=True)
+
+
+@router.get("", response_model=AuthEventsResponse)
+async def get_events(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    event_type: str | None = Query(None, pattern="^(" + "|".join(EVENT_TYPES) + ")$"),
+    identity: TokenIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db)
+):
+    """События безопасности текущего пользователя, новые первыми.
+
+    Только записанные в базу: событие из буфера появится не позже AUTH_EVENTS_FLUSH_INTERVAL.
+    """
+    # Индекс (user_id, created_at): постранично по убыванию (created_at, id)
+    query = (
+        select(AuthEvent.id, AuthEvent.event_type, AuthEvent.created_at, AuthEvent.login, AuthEvent.ip, AuthEvent.session_id)
+        .where(AuthEvent.user_id == identity.id)
+        .order_by(AuthEvent.created_at.desc(), AuthEvent.id.desc())
+        .limit(limit + 1)
+    )
+    if event_type:
+        query = query.where(AuthEvent.event_type == event_type)
+    if cursor:
+        query = query.where(tuple_(AuthEvent.created_at, AuthEvent.id) < tuple_(*decode_cursor(cursor)))
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    events = [
+        {
+            "id": row.id,
+            "event_type": row.event_type,
+            # orjson пишет datetime в ISO 8601
+            "created_at": row.created_at,
+            "login": row.login,
+            "ip": row.ip,
+            "session_id": row.session_id,
+        }
+        for row in rows
+    ]
+    return ORJSONResponse({"events": events, "next_cursor": next_cursor})
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from logging import getLogger
 
-from schemas import SessionsResponse, SessionResponse
-from dependencies import get_db, get_current_user
+from schemas import SessionsResponse, TerminateSessionsRequest, TerminateSessionsResponse
+from auth_events import record_event
+from dependencies import get_db, get_current_identity
 from models import User, UserSession
+from principals import TokenIdentity
+from session_registry import session_registry
+from session_store import bump_state_version, session_writer
+from pagination import decode_cursor, encode_cursor
+from responses import REVALIDATE, ORJSONResponse, conditional, format_time, make_etag
 
 
 router = APIRouter(redirect_slashes=True)
@@ -14,40 +21,122 @@ logger = getLogger('sessions-logger')
 
 
 @router.get("", response_model=SessionsResponse)
-async def get_sessions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    sessions = db.query(UserSession).filter(UserSession.user_id == current_user.id).all()
+async def get_sessions(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    identity: TokenIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db)
+):
+    # Версия читается до строк: если сессии изменятся между запросами, ETag окажется старше
+    # тела и следующий опрос просто получит его заново, но не наоборот
+    version = await db.scalar(select(User.state_version).where(User.id == identity.id))
+    etag = make_etag("sessions", identity.id, version, identity.session_id, limit, cursor)
+    not_modified = conditional(request, "/api/sessions", etag)
+    if not_modified:
+        return not_modified
+
+    query = (
+        select(UserSession.id, UserSession.device, UserSession.start_time)
+        .where(UserSession.user_id == identity.id)
+        .order_by(UserSession.start_time, UserSession.id)
+        .limit(limit + 1)
+    )
+    if cursor:
+        query = query.where(
+            tuple_(UserSession.start_time, UserSession.id) > tuple_(*decode_cursor(cursor))
+        )
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+
+    # Строки из БД уже нужных типов: собираем ответ без моделей pydantic
+    current_id = identity.session_id
+    session_list = [
+        {
+            "id": row.id,
+            "device": row.device,
+            "start_time": format_time(row.start_time),
+            "is_current": row.id == current_id,
+        }
+        for row in rows
+    ]
+
+    return ORJSONResponse({"sessions": session_list, "next_cursor": next_cursor}, headers={"ETag": etag, **REVALIDATE})
+
+
+async def delete_sessions(db: AsyncSession, user_id: int, *criteria) -> int:
+    # Отложенные сессии должны попасть в базу раньше, чем их удаление
+    await session_writer.flush()
+    # Один DELETE по множеству вместо SELECT + delete на каждую сессию
+    result = await db.execute(
+        delete(UserSession)
+        .where(UserSession.user_id == user_id, *criteria)
+        .returning(UserSession.id)
+        .execution_options(synchronize_session=False)
+    )
+    session_ids = result.scalars().all()
+    if session_ids:
+        await bump_state_version(db, (user_id,), revoked=True)
+    await db.commit()
 
-    session_list = []
-    for session in sessions:
-        session_list.append(SessionResponse(
-            id=session.id,
-            device=session.device,
-            start_time=session.start_time.strftime("%H:%M %d-%m-%Y"),
-            is_current=session.id == sessions[-1].id if sessions else False
-        ))
+    for session_id in session_ids:
+        session_registry.discard(session_id)
+        record_event("session_terminated", user_id, session_id=session_id)
+    return len(session_ids)
+
+
+@router.post("/terminate", response_model=TerminateSessionsResponse)
+async def terminate_sessions(
+    request: TerminateSessionsRequest,
+    identity: TokenIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db)
+):
+    terminated = 0
+    if request.session_ids:
+        terminated = await delete_sessions(db, identity.id, UserSession.id.in_(request.session_ids))
+
+    logger.info(f'{terminated} sessions terminated by "{identity.login}"', extra={"event": "sessions_terminated"})
+    return TerminateSessionsResponse(message="Sessions terminated", terminated=terminated)
+
+
+@router.post("/terminate-others", response_model=TerminateSessionsResponse)
+async def terminate_other_sessions(
+    identity: TokenIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db)
+):
+    terminated = await delete_sessions(db, identity.id, UserSession.id != identity.session_id)
 
-    return SessionsResponse(sessions=session_list)
+    logger.info(f'{terminated} other sessions terminated by "{identity.login}"', extra={"event": "sessions_terminated"})
+    return TerminateSessionsResponse(message="Sessions terminated", terminated=terminated)
 
 
 @router.delete("/{session_id}")
 async def terminate_session(
     session_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    identity: TokenIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db)
 ):
-    session = db.query(UserSession).filter(
+    await session_writer.flush()
+    session = await db.scalar(select(UserSession).where(
         UserSession.id == session_id,
-        UserSession.user_id == current_user.id
-    ).first()
+        UserSession.user_id == identity.id
+    ))
 
     if not session:
-        logger.warn(f'Try of to deleting non-existing session from "{current_user.login}"')
+        logger.warning(f'Try of to deleting non-existing session from "{identity.login}"', extra={"event": "session_not_found"})
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
         )
 
-    db.delete(session)
-    db.commit()
+    await db.delete(session)
+    await bump_state_version(db, (identity.id,), revoked=True)
+    await db.commit()
+    session_registry.discard(session_id)
+    record_event("session_terminated", identity.id, identity.login, session_id=session_id)
 
     return {"message": "Session terminated"}
@@ -1,99 +1,186 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from dataclasses import replace
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from logging import getLogger
 
-from totp_utils import generate_totp_secret, verify_totp_code, generate_qr_code
-from schemas import TOTPSetupResponse, TOTPVerifyRequest, TOTPVerifyResponse
-from dependencies import get_db, get_current_user
+from totp_utils import generate_totp_secret, verify_totp_code, verify_totp_codes_async, generate_qr_code_async, get_provisioning_uri, QRFormat
+from schemas import (
+    TOTPSetupResponse, TOTPVerifyRequest, TOTPVerifyResponse,
+    TOTPBatchVerifyRequest, TOTPBatchVerifyResponse
+)
+from auth import create_user_token
+from auth_events import record_event
+from dependencies import get_db, get_current_user, get_current_session_id, require_gateway_key
 from models import User, PendingTotp
+from principals import Principal, invalidate_principal
+from responses import ORJSONResponse
+from session_store import mark_session_verified
+from settings import settings
 
 
 router = APIRouter(redirect_slashes=False)
 
 logger = getLogger('totp-logger')
 
+# Сколько логинов запрашивать из БД за раз при пакетной проверке
+BATCH_LOOKUP_CHUNK = 5000
+
+
+def pending_totp_ttl() -> timedelta:
+    """Сколько живёт незавершённая настройка TOTP"""
+    return timedelta(minutes=settings.PENDING_TOTP_TTL_MINUTES)
+
 
 @router.post("/setup", response_model=TOTPSetupResponse)
 async def setup_totp(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    qr_format: QRFormat = Query("png", alias="format"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if current_user.totp_secret:
         raise HTTPException(status_code=400, detail="TOTP уже включён")
 
-    secret = generate_totp_secret()
+    existing = await db.scalar(select(PendingTotp).where(PendingTotp.user_id == current_user.id))
+    if existing and datetime.utcnow() - existing.created_at <= pending_totp_ttl():
+        # Повторное открытие настройки: тот же секрет, QR-код возьмётся из кеша
+        secret = existing.pending_totp_secret
+    else:
+        secret = generate_totp_secret()
 
-    # Удаляем старую pending-запись, если есть
-    existing = db.query(PendingTotp).filter(PendingTotp.user_id == current_user.id).first()
-    if existing:
-        db.delete(existing)
-        db.commit()
+        # Удаляем старую pending-запись, если есть
+        if existing:
+            await db.delete(existing)
+            await db.commit()
 
-    # Сохраняем в pending
-    pending = PendingTotp(
-        user_id=current_user.id,
-        pending_totp_secret=secret
-    )
-    db.add(pending)
-    db.commit()
+        # Сохраняем в pending
+        pending = PendingTotp(
+            user_id=current_user.id,
+            pending_totp_secret=secret
+        )
+        db.add(pending)
+        await db.commit()
 
-    qr_code = generate_qr_code(current_user.login, secret)
+    qr_code = await generate_qr_code_async(current_user.login, secret, qr_format)
 
-    return TOTPSetupResponse(secret=secret, qr_code=qr_code)
+    return TOTPSetupResponse(
+        secret=secret,
+        qr_code=qr_code,
+        provisioning_uri=get_provisioning_uri(current_user.login, secret)
+    )
 
 
 @router.post("/setup/verify", response_model=TOTPVerifyResponse)
 async def confirm_totp_setup(
     request: TOTPVerifyRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    session_id: int = Depends(get_current_session_id),
+    db: AsyncSession = Depends(get_db)
 ):
     if current_user.totp_secret:
         raise HTTPException(status_code=400, detail="TOTP уже включён")
 
-    pending = db.query(PendingTotp).filter(PendingTotp.user_id == current_user.id).first()
+    pending = await db.scalar(select(PendingTotp).where(PendingTotp.user_id == current_user.id))
 
     if not pending:
         raise HTTPException(status_code=400, detail="Нет активной настройки TOTP. Начните сначала.")
 
-    # Проверка срока действия (10 минут)
-    if datetime.utcnow() - pending.created_at > timedelta(minutes=10):
-        db.delete(pending)
-        db.commit()
+    # Проверка срока действия
+    if datetime.utcnow() - pending.created_at > pending_totp_ttl():
+        await db.delete(pending)
+        await db.commit()
         raise HTTPException(status_code=400, detail="Время настройки истекло. Начните заново.")
 
     if not verify_totp_code(pending.pending_totp_secret, request.code):
-        logger.warn(f'Invalid TOTP code got from "{current_user.login}"')
+        logger.warning(f'Invalid TOTP code got from "{current_user.login}"', extra={"event": "totp_invalid"})
+        record_event("totp_invalid", current_user.id, current_user.login, session_id=session_id)
         raise HTTPException(status_code=400, detail="Неверный TOTP-код")
 
-    current_user.totp_secret = pending.pending_totp_secret
-    db.delete(pending)
-    db.commit()
+    # Условие в UPDATE: снимок в кеше мог не застать включение TOTP в другом процессе
+    result = await db.execute(
+        update(User)
+        .where(User.id == current_user.id, User.totp_secret.is_(None))
+        .values(
+            totp_secret=pending.pending_totp_secret,
+            state_version=User.state_version + 1,
+            state_changed_at=datetime.utcnow()
+        )
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        invalidate_principal(current_user.id)
+        raise HTTPException(status_code=400, detail="TOTP уже включён")
+    await db.delete(pending)
+    # Код только что введён - в этой сессии второй фактор пройден
+    await mark_session_verified(db, session_id)
+    await db.commit()
+    invalidate_principal(current_user.id)
+    record_event("totp_enabled", current_user.id, current_user.login, session_id=session_id)
 
-    return TOTPVerifyResponse(success=True, message="TOTP успешно включён")
+    token = create_user_token(replace(current_user, totp_secret=pending.pending_totp_secret), session_id, totp_verified=True)
+    return TOTPVerifyResponse(success=True, message="TOTP успешно включён", token=token)
 
 
 @router.post("/verify", response_model=TOTPVerifyResponse)
 async def verify_totp(
     request: TOTPVerifyRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    session_id: int = Depends(get_current_session_id),
+    db: AsyncSession = Depends(get_db)
 ):
     if not current_user.totp_secret:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="TOTP not set up for this user"
-        )
+        # Снимок в кеше мог не застать включение TOTP в другом процессе: перед отказом читаем БД
+        invalidate_principal(current_user.id)
+        user = await db.get(User, current_user.id)
+        if user is None or not user.totp_secret:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="TOTP not set up for this user"
+            )
+        current_user = Principal.from_user(user)
 
     is_valid = verify_totp_code(current_user.totp_secret, request.code)
 
     if is_valid:
-        logger.info(f'Correct TOTP code got from "{current_user.login}"')
-        return TOTPVerifyResponse(success=True, message="TOTP code verified")
+        await mark_session_verified(db, session_id)
+        await db.commit()
+        logger.info(f'Correct TOTP code got from "{current_user.login}"', extra={"event": "totp_valid"})
+        record_event("totp_valid", current_user.id, current_user.login, session_id=session_id)
+        token = create_user_token(current_user, session_id, totp_verified=True)
+        return ORJSONResponse({"success": True, "message": "TOTP code verified", "token": token})
     else:
-        logger.warn(f'Invalid TOTP code got from "{current_user.login}"')
+        logger.warning(f'Invalid TOTP code got from "{current_user.login}"', extra={"event": "totp_invalid"})
+        record_event("totp_invalid", current_user.id, current_user.login, session_id=session_id)
+        # 400, а не 401: на 401 клиент обновляет токен и повторяет запрос, тратя ещё одну попытку
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
+            status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid TOTP code"
         )
+
+
+@router.post("/verify/batch", response_model=TOTPBatchVerifyResponse, dependencies=[Depends(require_gateway_key)])
+async def verify_totp_batch(
+    request: TOTPBatchVerifyRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    logins = list({item.login for item in request.items})
+    secrets = {}
+    for start in range(0, len(logins), BATCH_LOOKUP_CHUNK):
+        rows = await db.execute(
+            select(User.login, User.totp_secret)
+            .where(User.login.in_(logins[start:start + BATCH_LOOKUP_CHUNK]), User.totp_secret.is_not(None))
+        )
+        secrets.update(rows.tuples().all())
+
+    # Пользователи без TOTP сразу получают False, остальные проверяются одной пачкой в потоке
+    checked = [item for item in request.items if item.login in secrets]
+    verified = iter(await verify_totp_codes_async((secrets[item.login], item.code) for item in checked))
+    results = [
+        {"login": item.login, "valid": next(verified) if item.login in secrets else False}
+        for item in request.items
+    ]
+
+    invalid = sum(not result["valid"] for result in results)
+    logger.info(f'Batch TOTP verification: {len(results)} codes, {invalid} invalid', extra={"event": "totp_batch"})
+    return ORJSONResponse({"results": results})
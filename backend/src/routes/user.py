@@ -1,76 +1,164 @@
-from os import urandom
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from hmac import compare_digest
+from os import urandom
+from math import ceil
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from logging import getLogger
 
-from dependencies import get_db, get_current_user
+from auth_events import record_event
+from dependencies import get_db, get_current_identity
 from models import User, UserSession
-from auth import get_password_hash, verify_password, create_access_token
-from schemas import RegisterRequest, RegisterResponse, LoginRequest, LoginResponse, UserResponse
+from principals import TokenIdentity
+from session_store import create_session, load_session
+from ratelimit import login_limiter, ip_limiter
+from auth import (
+    access_token_lifetime, create_user_token, format_refresh_token,
+    hash_password_async, hash_refresh_secret, new_refresh_secret, parse_refresh_token,
+    session_lifetime, verify_and_update_password_async
+)
+from responses import REVALIDATE, ORJSONResponse, conditional, format_date, make_etag
+from schemas import (
+    RegisterRequest, RegisterResponse, LoginRequest, LoginResponse, RefreshRequest, TokenResponse, UserResponse
+)
 
 router = APIRouter(redirect_slashes=True)
 
 logger = getLogger('user-logger')
 
 
+def client_host(request: Request) -> str:
+    # За доверенным прокси (WEB_FORWARDED_ALLOW_IPS) uvicorn уже подставил адрес из X-Forwarded-For
+    return request.client.host if request.client else "unknown"
+
+
 @router.post("/register", response_model=RegisterResponse)
-async def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, http_request: Request, db: AsyncSession = Depends(get_db)):
     # Проверяем, существует ли пользователь
-    existing_user = db.query(User).filter(User.login == request.login).first()
+    existing_user = await db.scalar(select(User).where(User.login == request.login))
     if existing_user:
-        logger.warn(f'Attempt of reusing login "{request.login}"')
+        logger.warning(f'Attempt of reusing login "{request.login}"', extra={"event": "login_reused"})
+        record_event("login_reused", existing_user.id, request.login, client_host(http_request))
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this login already exists"
         )
 
     # Создаем нового пользователя
-    hashed_password = get_password_hash(request.password)
+    hashed_password = await hash_password_async(request.password)
     new_user = User(login=request.login, password_hash=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
-    logger.info(f'New user "{request.login}" created')
+    logger.info(f'New user "{request.login}" created', extra={"event": "user_registered"})
     return RegisterResponse(message="user создан")
 
 
 @router.post("/login", response_model=LoginResponse)
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.login == request.login).first()
-    if not user or not verify_password(request.password, user.password_hash):
-        logger.warn(f'Unsuccessful login from "{request.login}"')
+async def login(request: LoginRequest, http_request: Request, db: AsyncSession = Depends(get_db)):
+    # Отсекаем перебор до запроса в БД и хеширования пароля
+    client_ip = client_host(http_request)
+    retry_after = ip_limiter.hit(client_ip) or login_limiter.hit(request.login)
+    if retry_after:
+        logger.warning(f'Too many login attempts for "{request.login}" from {client_ip}', extra={"event": "login_throttled"})
+        record_event("login_throttled", login=request.login, ip=client_ip)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(ceil(retry_after))}
+        )
+
+    user = await db.scalar(select(User).where(User.login == request.login))
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await verify_and_update_password_async(request.password, user.password_hash)
+    if not verified:
+        logger.warning(f'Unsuccessful login from "{request.login}"', extra={"event": "login_failed"})
+        record_event("login_failed", user.id if user else None, request.login, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid login or password"
         )
 
-    token = create_access_token(data={"sub": str(user.id)})
+    if new_hash:
+        # Хеш старой схемы или стоимости: заменяем, пока известен пароль
+        user.password_hash = new_hash
+        logger.info(f'Password hash of "{request.login}" upgraded', extra={"event": "password_rehashed"})
 
-    session = UserSession(
-        user_id=user.id,
-        device="DESKTOP-" + urandom(4).hex().upper(),
-        start_time=datetime.now()
-    )
-    db.add(session)
-    db.commit()
+    refresh_secret, refresh_hash = new_refresh_secret()
+    session_id = await create_session(db, user.id, "DESKTOP-" + urandom(4).hex().upper(), refresh_hash)
+
+    # Токен привязан к сессии: после её завершения он перестаёт приниматься
+    token = create_user_token(user, session_id, totp_verified=False)
+    refresh_token = format_refresh_token(session_id, refresh_secret)
+    expires_in = int(access_token_lifetime().total_seconds())
+
+    # Пароль верен; с TOTP вход завершится проверкой кода (totp_valid)
+    record_event("login_success", user.id, request.login, client_ip, session_id)
 
     # Если у пользователя включен TOTP, возвращаем флаг
     if user.totp_secret:
-        return LoginResponse(
-            token=token,
-            message="TOTP required"
-        )
+        message = "TOTP required"
+    else:
+        message = "Login successful"
+        logger.info(f'Successful login from "{request.login}"', extra={"event": "login_success"})
+    return ORJSONResponse({
+        "token": token, "refresh_token": refresh_token, "expires_in": expires_in, "message": message
+    })
 
-    logger.info(f'Successful login from "{request.login}"')
-    return LoginResponse(token=token, message="Login successful")
 
+@router.post("/token/refresh", response_model=TokenResponse)
+async def refresh_token(request: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    # Единственное место, где состояние пользователя читается из БД для выпуска токена
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token"
+    )
+    parsed = parse_refresh_token(request.refresh_token)
+    if parsed is None:
+        raise invalid
+    session_id, secret = parsed
 
-@router.get("/user", response_model=UserResponse)
-async def get_user(current_user: User = Depends(get_current_user)):
-    return UserResponse(
-        username=current_user.login,
-        signup_date=current_user.created_at.strftime("%d-%m-%Y"),
-        totp_enabled=bool(current_user.totp_secret)
+    session = await load_session(db, session_id)
+    if session is None or datetime.utcnow() - session.start_time > session_lifetime():
+        raise invalid
+
+    secret_hash = hash_refresh_secret(secret)
+    if not session.refresh_token_hash or not compare_digest(secret_hash, session.refresh_token_hash):
+        logger.warning(f'Stale refresh token for session {session_id}', extra={"event": "refresh_token_reused"})
+        record_event("refresh_token_reused", session.user_id, session_id=session_id)
+        raise invalid
+
+    # Ротация: условный UPDATE, чтобы два одновременных обновления не получили по токену
+    new_secret, new_hash = new_refresh_secret()
+    result = await db.execute(
+        update(UserSession)
+        .where(UserSession.id == session_id, UserSession.refresh_token_hash == secret_hash)
+        .values(refresh_token_hash=new_hash)
     )
+    if result.rowcount != 1:
+        raise invalid
+    user = await db.get(User, session.user_id)
+    await db.commit()
+
+    return ORJSONResponse({
+        "token": create_user_token(user, session_id, session.totp_verified),
+        "refresh_token": format_refresh_token(session_id, new_secret),
+        "expires_in": int(access_token_lifetime().total_seconds()),
+    })
+
+
+@router.get("/user", response_model=UserResponse)
+async def get_user(request: Request, identity: TokenIdentity = Depends(get_current_identity)):
+    # Ответ целиком из claims токена, и ETag тоже: версия из БД здесь не нужна
+    etag = make_etag("user", identity.id, identity.login, identity.created_at.isoformat(), identity.totp_enabled)
+    not_modified = conditional(request, "/api/user", etag)
+    if not_modified:
+        return not_modified
+    return ORJSONResponse({
+        "username": identity.login,
+        "signup_date": format_date(identity.created_at),
+        "totp_enabled": identity.totp_enabled,
+    }, headers={"ETag": etag, **REVALIDATE})
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class RegisterRequest(BaseModel):
@@ -17,12 +17,25 @@ class LoginRequest(BaseModel):
 
 class LoginResponse(BaseModel):
     token: str
+    refresh_token: str
+    expires_in: int
     message: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class TokenResponse(BaseModel):
+    token: str
+    refresh_token: str
+    expires_in: int
+
+
 class TOTPSetupResponse(BaseModel):
     secret: str
-    qr_code: str
+    qr_code: str | None
+    provisioning_uri: str
 
 
 class TOTPVerifyRequest(BaseModel):
@@ -32,6 +45,26 @@ class TOTPVerifyRequest(BaseModel):
 class TOTPVerifyResponse(BaseModel):
     success: bool
     message: str
+    # Новый access-токен с обновлёнными claims TOTP
+    token: str | None = None
+
+
+class TOTPBatchVerifyItem(BaseModel):
+    login: str
+    code: str
+
+
+class TOTPBatchVerifyRequest(BaseModel):
+    items: list[TOTPBatchVerifyItem] = Field(max_length=10000)
+
+
+class TOTPBatchVerifyResult(BaseModel):
+    login: str
+    valid: bool
+
+
+class TOTPBatchVerifyResponse(BaseModel):
+    results: list[TOTPBatchVerifyResult]
 
 
 class UserResponse(BaseModel):
@@ -49,3 +82,27 @@ class SessionResponse(BaseModel):
 
 class SessionsResponse(BaseModel):
     sessions: list[SessionResponse]
+    next_cursor: str | None = None
+
+
+class TerminateSessionsRequest(BaseModel):
+    session_ids: list[int] = Field(max_length=1000)
+
+
+class TerminateSessionsResponse(BaseModel):
+    message: str
+    terminated: int
+
+
+class AuthEventResponse(BaseModel):
+    id: int
+    event_type: str
+    created_at: str
+    login: str | None
+    ip: str | None
+    session_id: int | None
+
+
+class AuthEventsResponse(BaseModel):
+    events: list[AuthEventResponse]
+    next_cursor: str | None = None
@@ -0,0 +1,166 @@
+"""Production-запуск: несколько процессов uvicorn на одном сокете.
+
+Главный процесс импортирует приложение и прогревает всё, что можно разделить после fork
+(модули, в том числе загружаемые лениво, движок БД без соединений, ключи JWT, бэкенды
+хеширования), открывает сокет и запускает WEB_WORKERS дочерних процессов. Упавший или отработавший WEB_MAX_REQUESTS процесс
+заменяется новым; по SIGTERM/SIGINT процессы дорабатывают текущие запросы не дольше
+WEB_GRACEFUL_TIMEOUT секунд.
+
+Запуск: python src/server.py
+"""
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from logging import getLogger
+
+import uvicorn
+
+from settings import settings
+
+
+logger = getLogger('server-logger')
+
+# Процесс, упавший быстрее, перезапускается с паузой, чтобы не крутиться в цикле
+MIN_WORKER_LIFETIME = 1.0
+
+
+def warm_up():
+    """Всё, что загружено здесь, дочерние процессы получают готовым через copy-on-write"""
+    import main  # noqa: F401 - приложение, маршруты, движок БД, метрики
+    import totp_utils
+    from auth import get_jwt_keys, pwd_context
+
+    # Модули и ключи, которые приложение загружает при первом запросе
+    totp_utils.preload()
+    get_jwt_keys()
+    # passlib выбирает бэкенд bcrypt/argon2 при первом хешировании
+    for scheme in pwd_context.schemes():
+        pwd_context.handler(scheme).get_backend()
+
+    # Объекты, созданные при импорте, больше не нужно обходить сборщику мусора
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in settings.WEB_HOST else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((settings.WEB_HOST, settings.WEB_PORT))
+    sock.listen(settings.WEB_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, index: int, workers: int):
+    # Ядра делятся между процессами: каждому - своя часть пула хеширования
+    if not settings.HASH_WORKERS:
+        settings.HASH_WORKERS = max(1, (os.cpu_count() or 1) // workers)
+    # Очистка и архивация нужны в одном экземпляре
+    settings.BACKGROUND_JOBS = settings.BACKGROUND_JOBS and index == 0
+
+    max_requests = None
+    if settings.WEB_MAX_REQUESTS:
+        # Разброс, чтобы процессы не перезапускались одновременно
+        max_requests = settings.WEB_MAX_REQUESTS + random.randint(0, settings.WEB_MAX_REQUESTS_JITTER)
+
+    from main import app
+
+    config = uvicorn.Config(
+        app,
+        # auto: uvloop и httptools, если установлены
+        loop="auto",
+        http="auto",
+        limit_max_requests=max_requests,
+        # Адрес клиента из X-Forwarded-For - только если соединение пришло от доверенного прокси
+        proxy_headers=True,
+        forwarded_allow_ips=settings.WEB_FORWARDED_ALLOW_IPS,
+        timeout_graceful_shutdown=settings.WEB_GRACEFUL_TIMEOUT,
+        log_config=None,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Arbiter:
+    def __init__(self, sock: socket.socket, workers: int):
+        self.sock = sock
+        self.workers = workers
+        # pid -> (номер процесса, время запуска)
+        self.children: dict[int, tuple[int, float]] = {}
+        self.stopping = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGALRM):
+                    signal.signal(signum, signal.SIG_DFL)
+                run_worker(self.sock, index, self.workers)
+            except BaseException:
+                logger.exception(f'Worker {index} failed')
+                code = 1
+            finally:
+                # Без atexit и деструкторов, унаследованных от главного процесса
+                os._exit(code)
+        self.children[pid] = (index, time.monotonic())
+        logger.info(f'Started worker {index} (pid {pid})')
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f'Stopping {len(self.children)} workers')
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        # Кто не успел доработать - завершается принудительно
+        signal.alarm(settings.WEB_GRACEFUL_TIMEOUT + 5)
+
+    def kill(self, signum, frame):
+        for pid in self.children:
+            logger.warning(f'Killing worker pid {pid} after graceful timeout')
+            os.kill(pid, signal.SIGKILL)
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGALRM, self.kill)
+
+        for index in range(self.workers):
+            self.spawn(index)
+
+        while self.children:
+            # Обработчики сигналов выполняются между попытками, wait() после них продолжается
+            pid, status = os.wait()
+            index, started = self.children.pop(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                continue
+
+            # Выход с кодом 0 - перезапуск после WEB_MAX_REQUESTS, остальное - сбой
+            if code != 0:
+                logger.error(f'Worker {index} (pid {pid}) exited with code {code}')
+                if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                    time.sleep(MIN_WORKER_LIFETIME)
+                if self.stopping:
+                    continue
+            self.spawn(index)
+
+        signal.alarm(0)
+        logger.info('All workers stopped')
+        return 0
+
+
+def main() -> int:
+    workers = settings.WEB_WORKERS or os.cpu_count() or 1
+    warm_up()
+    sock = bind_socket()
+    logger.info(f'Listening on {settings.WEB_HOST}:{settings.WEB_PORT} with {workers} workers')
+    return Arbiter(sock, workers).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
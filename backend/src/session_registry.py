@@ -0,0 +1,140 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from metrics import CallbackMetric
+from models import UserSession
+
+
+class SessionRegistry:
+    """Битовая карта активных id сессий для проверки токенов без запроса в БД.
+
+    Для id <= high_water карта полная: сброшенный бит означает, что сессия удалена.
+    Про более новые id (созданные, например, другим процессом) карта знает только то,
+    что в неё добавили явно, остальное нужно проверить в БД.
+
+    Сессии, завершённые другим процессом, карта узнаёт только при полном перечитывании.
+    До него установленный бит сессии пользователя из changed_users (его сессии менялись
+    где-то ещё) тоже перепроверяется в БД.
+    """
+
+    def __init__(self):
+        self._bits = bytearray()
+        self.high_water = 0
+        self.changed_users: set[int] = set()
+        # Изменения, сделанные во время перечитывания карты из БД
+        self._changes: dict[int, bool] | None = None
+        self._changed_during: set[int] | None = None
+
+    def track_changes(self):
+        """Начинает запоминать add/discard и mark_changed, чтобы replace_with не потерял их"""
+        self._changes = {}
+        self._changed_during = set()
+
+    def stop_tracking(self):
+        self._changes = self._changed_during = None
+
+    def replace_with(self, other: "SessionRegistry"):
+        """Подменяет карту загруженной; изменения с track_changes() применяются поверх неё.
+
+        Загруженная карта уже учитывает изменения пользователей, отмеченных до начала загрузки.
+        """
+        changes, self._changes = self._changes, None
+        changed_during, self._changed_during = self._changed_during, None
+        self._bits = other._bits
+        self.high_water = other.high_water
+        self.changed_users = changed_during or set()
+        for session_id, active in (changes or {}).items():
+            if active:
+                self.add(session_id)
+            else:
+                self.discard(session_id)
+
+    def mark_changed(self, user_ids):
+        user_ids = set(user_ids)
+        self.changed_users |= user_ids
+        if self._changed_during is not None:
+            self._changed_during |= user_ids
+
+    def add(self, session_id: int):
+        if self._changes is not None:
+            self._changes[session_id] = True
+        index = session_id >> 3
+        if index >= len(self._bits):
+            self._bits.extend(bytes(index - len(self._bits) + 1))
+        self._bits[index] |= 1 << (session_id & 7)
+
+    def discard(self, session_id: int):
+        if self._changes is not None:
+            self._changes[session_id] = False
+        index = session_id >> 3
+        if index < len(self._bits):
+            self._bits[index] &= ~(1 << (session_id & 7)) & 0xFF
+
+    def is_active(self, session_id: int) -> bool | None:
+        """True/False, если ответ известен, None - если нужно спросить БД"""
+        index = session_id >> 3
+        if index < len(self._bits) and self._bits[index] & (1 << (session_id & 7)):
+            return True
+        if session_id <= self.high_water:
+            return False
+        return None
+
+    def __len__(self):
+        return sum(byte.bit_count() for byte in self._bits)
+
+
+session_registry = SessionRegistry()
+
+CallbackMetric("session_registry_active", "Active session ids known to this process", lambda: len(session_registry))
+CallbackMetric(
+    "session_registry_changed_users", "Users whose sessions are rechecked in the database until the next reload",
+    lambda: len(session_registry.changed_users)
+)
+
+
+async def warm_session_registry(db: AsyncSession, before_load=None):
+    """Загружает id всех сессий: при старте приложения и периодически, чтобы узнать о сессиях,
+    созданных и завершённых другими процессами.
+
+    before_load - корутина, которая вызывается после начала отслеживания локальных изменений
+    (например, сброс отложенных сессий в БД).
+    """
+    session_registry.track_changes()
+    try:
+        if before_load is not None:
+            await before_load()
+
+        high_water = await db.scalar(select(func.max(UserSession.id))) or 0
+        result = await db.stream_scalars(
+            select(UserSession.id)
+            .where(UserSession.id <= high_water)
+            .execution_options(yield_per=10000)
+        )
+
+        loaded = SessionRegistry()
+        async for session_id in result:
+            loaded.add(session_id)
+        loaded.high_water = high_water
+    except BaseException:
+        session_registry.stop_tracking()
+        raise
+    session_registry.replace_with(loaded)
+
+
+async def is_session_active(db: AsyncSession, session_id, user_id=None) -> bool:
+    if not isinstance(session_id, int) or session_id <= 0:
+        return False
+
+    active = session_registry.is_active(session_id)
+    # Отрицательный ответ тоже перепроверяем: другой процесс мог получить меньший id, но
+    # закоммитить сессию уже после загрузки карты. Такие токены редки - сессия завершена
+    if not active:
+        active = await db.get(UserSession, session_id) is not None
+        if active:
+            session_registry.add(session_id)
+    elif str(user_id).isdigit() and int(user_id) in session_registry.changed_users:
+        # Сессии пользователя менялись, возможно в другом процессе: бит мог устареть
+        active = await db.get(UserSession, session_id) is not None
+        if not active:
+            session_registry.discard(session_id)
+    return active
@@ -0,0 +1,130 @@
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from batch_writer import BatchWriter
+from models import User, UserSession
+from session_registry import session_registry
+from settings import settings
+
+
+class SessionIdAllocator:
+    """Выдаёт id сессий до вставки строки: токену id нужен сразу.
+
+    В PostgreSQL id берутся блоками из последовательности user_sessions, так что несколько
+    процессов не пересекаются. В остальных базах блок начинается после максимального id -
+    это годится только для одного процесса (SQLite в разработке и тестах).
+    """
+
+    def __init__(self, block: int):
+        self.block = block
+        self._ids = deque()
+        self._last = 0
+
+    async def next(self, db: AsyncSession) -> int:
+        while not self._ids:
+            await self._refill(db)
+        return self._ids.popleft()
+
+    async def _refill(self, db: AsyncSession):
+        if db.bind.dialect.name == "postgresql":
+            ids = await db.scalars(
+                text("SELECT nextval('user_sessions_id_seq') FROM generate_series(1, :count)"),
+                {"count": self.block}
+            )
+            self._ids.extend(ids)
+            return
+
+        current = await db.scalar(select(func.max(UserSession.id))) or 0
+        start = max(current, self._last) + 1
+        self._last = start + self.block - 1
+        self._ids.extend(range(start, self._last + 1))
+
+
+async def bump_state_version(db: AsyncSession, user_ids, revoked: bool = False):
+    """Увеличивает users.state_version, чтобы ETag /api/sessions сменился; коммит за вызывающим.
+
+    Вызывается в той же транзакции, что и изменение сессий: новая версия не видна раньше новых данных.
+    revoked=True - сессии удалены: метка sessions_revoked_at сообщит об этом другим процессам.
+    """
+    user_ids = set(user_ids)
+    if user_ids:
+        values = {"state_version": User.state_version + 1}
+        if revoked:
+            values["sessions_revoked_at"] = datetime.utcnow()
+        await db.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def _bump_batch_versions(db: AsyncSession, rows: list[dict]):
+    await bump_state_version(db, (row["user_id"] for row in rows))
+
+
+def _forget_unwritten_sessions(rows: list[dict]):
+    # Строк нет и не будет: токены этих сессий не должны приниматься и процессом, который их выдал
+    for row in rows:
+        session_registry.discard(row["id"])
+
+
+# Параметры аллокатора и писателя фиксируются при импорте модуля
+session_ids = SessionIdAllocator(settings.SESSION_ID_BLOCK)
+session_writer = BatchWriter(
+    UserSession.__table__,
+    max_batch=settings.SESSION_FLUSH_SIZE,
+    interval=settings.SESSION_FLUSH_INTERVAL,
+    max_pending=settings.SESSION_QUEUE_LIMIT,
+    before_commit=_bump_batch_versions,
+    on_error=_forget_unwritten_sessions,
+)
+
+
+async def create_session(db: AsyncSession, user_id: int, device: str, refresh_token_hash: str) -> int:
+    """Создаёт сессию согласно SESSION_WRITE_MODE и возвращает её id.
+
+    Несохранённые изменения db коммитятся вместе с сессией (sync) или отдельно (group/async).
+    """
+    start_time = datetime.utcnow()
+
+    if settings.SESSION_WRITE_MODE == "sync" or not session_writer.running:
+        session = UserSession(
+            user_id=user_id, device=device, start_time=start_time, refresh_token_hash=refresh_token_hash
+        )
+        db.add(session)
+        await bump_state_version(db, (user_id,))
+        await db.commit()
+        session_id = session.id
+    else:
+        if db.dirty:
+            await db.commit()
+        session_id = await session_ids.next(db)
+        row = {
+            "id": session_id, "user_id": user_id, "device": device, "start_time": start_time,
+            "refresh_token_hash": refresh_token_hash, "totp_verified": False,
+        }
+        await session_writer.write(row, wait=settings.SESSION_WRITE_MODE == "group")
+
+    # В режиме async - до записи строки: токен сразу принимается этим процессом, другие узнают
+    # о сессии после коммита пачки, а если пачка не запишется, on_error уберёт сессию из реестра
+    session_registry.add(session_id)
+    return session_id
+
+
+async def load_session(db: AsyncSession, session_id: int) -> UserSession | None:
+    session = await db.get(UserSession, session_id)
+    if session is None and session_writer.running:
+        # Сессия может ещё ждать записи в буфере
+        await session_writer.flush()
+        session = await db.get(UserSession, session_id)
+    return session
+
+
+async def mark_session_verified(db: AsyncSession, session_id: int):
+    """Отмечает, что в сессии пройден второй фактор; коммит за вызывающим"""
+    await session_writer.flush()
+    await db.execute(update(UserSession).where(UserSession.id == session_id).values(totp_verified=True))
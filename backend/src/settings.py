@@ -8,21 +8,178 @@ def loadenv(key: str):
     return value
 
 
-def loadsecret(key: str):
+def loadoption(key: str, default, cast=str):
+    value = os.getenv(key)
+    if value is None:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"{key} has invalid value {value!r}!")
+
+
+def asbool(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(value)
+
+
+def loadsecret(key: str, required: bool = True):
     try:
         with open(f'/run/secrets/{key}', 'r') as f:
             return f.read().strip()
     except FileNotFoundError:
+        if not required:
+            return None
         raise ValueError(f"{key} must be set in secrets!")
 
 
+class lazy:
+    """Настройка, которая читается при первом обращении и дальше хранится в экземпляре.
+
+    Присваивание (в том числе monkeypatch в тестах) просто подменяет сохранённое значение.
+    """
+
+    def __init__(self, load, *args, **kwargs):
+        self.load = load
+        self.args = args
+        self.kwargs = kwargs
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = self.load(*self.args, **self.kwargs)
+        instance.__dict__[self.name] = value
+        return value
+
+
 class Settings:
     POSTGRES_HOST = 'database'
     POSTGRES_PORT = '5432'
-    POSTGRES_DB = loadenv("POSTGRES_DB")
-    POSTGRES_USER = loadenv("POSTGRES_USER")
-    POSTGRES_PASSWORD = loadsecret("db_password")
-    JWT_SECRET_KEY = loadsecret("jwt_key")
+    POSTGRES_DB = lazy(loadenv, "POSTGRES_DB")
+    POSTGRES_USER = lazy(loadenv, "POSTGRES_USER")
+    POSTGRES_PASSWORD = lazy(loadsecret, "db_password")
+    # Подпись JWT: закрытый ключ RSA/EC (PEM) и дополнительные открытые ключи для смены ключа;
+    # jwt_key - общий секрет HS256, без закрытого ключа подписывает им, иначе принимает старые токены
+    # только при JWT_LEGACY_HS256 (на ACCESS_TOKEN_TTL_MINUTES после перехода на ключи)
+    JWT_PRIVATE_KEY = lazy(loadsecret, "jwt_private_key", required=False)
+    JWT_PUBLIC_KEYS = lazy(loadsecret, "jwt_public_keys", required=False)
+    JWT_SECRET_KEY = lazy(loadsecret, "jwt_key", required=False)
+    JWT_LEGACY_HS256 = lazy(loadoption, "JWT_LEGACY_HS256", False, asbool)
+    # Сколько другим сервисам можно кешировать /.well-known/jwks.json
+    JWKS_MAX_AGE = lazy(loadoption, "JWKS_MAX_AGE", 300, int)
+
+    # Срок жизни access-токена; сессия и её refresh-токен живут SESSION_TTL_DAYS от входа
+    ACCESS_TOKEN_TTL_MINUTES = lazy(loadoption, "ACCESS_TOKEN_TTL_MINUTES", 15, float)
+    SESSION_TTL_DAYS = lazy(loadoption, "SESSION_TTL_DAYS", 30, float)
+
+    # Полный URL базы (например, sqlite+aiosqlite:///test.db), иначе собирается из POSTGRES_*
+    DATABASE_URL = lazy(loadoption, "DATABASE_URL", None)
+    # Пул соединений (для sqlite не используется)
+    DB_POOL_SIZE = lazy(loadoption, "DB_POOL_SIZE", 10, int)
+    DB_MAX_OVERFLOW = lazy(loadoption, "DB_MAX_OVERFLOW", 20, int)
+    DB_POOL_TIMEOUT = lazy(loadoption, "DB_POOL_TIMEOUT", 30, int)
+    DB_POOL_PRE_PING = lazy(loadoption, "DB_POOL_PRE_PING", True, asbool)
+    DB_POOL_RECYCLE = lazy(loadoption, "DB_POOL_RECYCLE", 1800, int)
+    # Кеш подготовленных выражений asyncpg на соединение (0 - выключить, нужно за pgbouncer)
+    DB_STATEMENT_CACHE_SIZE = lazy(loadoption, "DB_STATEMENT_CACHE_SIZE", 100, int)
+
+    # Пул процессов для хеширования паролей (0 - по числу ядер)
+    HASH_WORKERS = lazy(loadoption, "HASH_WORKERS", 0, int)
+    # Сколько операций хеширования может ожидать в очереди, прежде чем отвечать 503
+    HASH_QUEUE_LIMIT = lazy(loadoption, "HASH_QUEUE_LIMIT", 64, int)
+    # Схема хеширования паролей (bcrypt или argon2) и её стоимость; подбирается scripts/calibrate_hashing.py.
+    # Хеши другой схемы или с меньшей стоимостью пересчитываются при следующем входе
+    PASSWORD_SCHEME = lazy(loadoption, "PASSWORD_SCHEME", "bcrypt")
+    BCRYPT_ROUNDS = lazy(loadoption, "BCRYPT_ROUNDS", 12, int)
+    ARGON2_TIME_COST = lazy(loadoption, "ARGON2_TIME_COST", 3, int)
+    ARGON2_MEMORY_COST = lazy(loadoption, "ARGON2_MEMORY_COST", 65536, int)  # КиБ
+    ARGON2_PARALLELISM = lazy(loadoption, "ARGON2_PARALLELISM", 4, int)
+
+    # Запись сессии при входе: sync - INSERT и COMMIT до ответа; group - ответ после коммита общей пачки;
+    # async - ответ сразу, пачка пишется в фоне (при падении процесса теряются сессии последних SESSION_FLUSH_INTERVAL секунд)
+    SESSION_WRITE_MODE = lazy(loadoption, "SESSION_WRITE_MODE", "sync")
+    SESSION_FLUSH_SIZE = lazy(loadoption, "SESSION_FLUSH_SIZE", 500, int)
+    SESSION_FLUSH_INTERVAL = lazy(loadoption, "SESSION_FLUSH_INTERVAL", 0.05, float)
+    SESSION_QUEUE_LIMIT = lazy(loadoption, "SESSION_QUEUE_LIMIT", 10000, int)
+    # Сколько id сессий резервировать за одно обращение к последовательности
+    SESSION_ID_BLOCK = lazy(loadoption, "SESSION_ID_BLOCK", 100, int)
+
+    # Перенос истёкших сессий (старше SESSION_TTL_DAYS) в user_sessions_archive: период и размер пачки;
+    # для секционированной user_sessions - на сколько месяцев вперёд создавать секции
+    SESSION_ARCHIVE_INTERVAL = lazy(loadoption, "SESSION_ARCHIVE_INTERVAL", 3600, float)
+    SESSION_ARCHIVE_BATCH = lazy(loadoption, "SESSION_ARCHIVE_BATCH", 1000, int)
+    SESSION_PARTITIONS_AHEAD = lazy(loadoption, "SESSION_PARTITIONS_AHEAD", 2, int)
+
+    # Журнал auth_events: пачка пишется по размеру или по времени, при переполненном буфере события теряются;
+    # события старше AUTH_EVENTS_RETENTION_DAYS удаляются фоновой задачей
+    AUTH_EVENTS_FLUSH_SIZE = lazy(loadoption, "AUTH_EVENTS_FLUSH_SIZE", 500, int)
+    AUTH_EVENTS_FLUSH_INTERVAL = lazy(loadoption, "AUTH_EVENTS_FLUSH_INTERVAL", 1.0, float)
+    AUTH_EVENTS_QUEUE_LIMIT = lazy(loadoption, "AUTH_EVENTS_QUEUE_LIMIT", 10000, int)
+    AUTH_EVENTS_RETENTION_DAYS = lazy(loadoption, "AUTH_EVENTS_RETENTION_DAYS", 90, float)
+    AUTH_EVENTS_PURGE_INTERVAL = lazy(loadoption, "AUTH_EVENTS_PURGE_INTERVAL", 3600, float)
+    AUTH_EVENTS_PURGE_BATCH = lazy(loadoption, "AUTH_EVENTS_PURGE_BATCH", 1000, int)
+
+    # Как часто каждый процесс перечитывает карту активных сессий из БД целиком (0 - только при старте)
+    SESSION_REGISTRY_REFRESH_INTERVAL = lazy(loadoption, "SESSION_REGISTRY_REFRESH_INTERVAL", 600, float)
+    # Как часто каждый процесс узнаёт о пользователях, чьи сессии завершались (users.sessions_revoked_at)
+    # или кто включал TOTP (users.state_changed_at) в других процессах; токены их сессий до полного
+    # перечитывания проверяются в БД, а закешированные пользователи сбрасываются
+    SESSION_CHANGES_POLL_INTERVAL = lazy(loadoption, "SESSION_CHANGES_POLL_INTERVAL", 1.0, float)
+
+    # Кеш пользователей для get_current_user
+    PRINCIPAL_CACHE_SIZE = lazy(loadoption, "PRINCIPAL_CACHE_SIZE", 10000, int)
+    PRINCIPAL_CACHE_TTL = lazy(loadoption, "PRINCIPAL_CACHE_TTL", 60, float)
+
+    # Кеш проверенных JWT
+    TOKEN_CACHE_SIZE = lazy(loadoption, "TOKEN_CACHE_SIZE", 10000, int)
+    TOKEN_CACHE_TTL = lazy(loadoption, "TOKEN_CACHE_TTL", 300, float)
+
+    # Ключ шлюза для пакетной проверки TOTP (без секрета эндпоинт выключен)
+    TOTP_GATEWAY_KEY = lazy(loadsecret, "totp_gateway_key", required=False)
+
+    # Ограничение попыток входа: на логин и на IP за окно в секундах
+    LOGIN_RATE_LIMIT_PER_LOGIN = lazy(loadoption, "LOGIN_RATE_LIMIT_PER_LOGIN", 10, int)
+    LOGIN_RATE_LIMIT_PER_IP = lazy(loadoption, "LOGIN_RATE_LIMIT_PER_IP", 100, int)
+    LOGIN_RATE_WINDOW = lazy(loadoption, "LOGIN_RATE_WINDOW", 60, float)
+    LOGIN_RATE_MAX_KEYS = lazy(loadoption, "LOGIN_RATE_MAX_KEYS", 100000, int)
+
+    # Незавершённая настройка TOTP: время жизни и фоновая очистка
+    PENDING_TOTP_TTL_MINUTES = lazy(loadoption, "PENDING_TOTP_TTL_MINUTES", 10, float)
+    PENDING_TOTP_SWEEP_INTERVAL = lazy(loadoption, "PENDING_TOTP_SWEEP_INTERVAL", 300, float)
+    PENDING_TOTP_SWEEP_BATCH = lazy(loadoption, "PENDING_TOTP_SWEEP_BATCH", 1000, int)
+
+    # Сервер src/server.py: число процессов (0 - по числу ядер), адрес и очередь соединений
+    WEB_WORKERS = lazy(loadoption, "WEB_WORKERS", 0, int)
+    WEB_HOST = lazy(loadoption, "WEB_HOST", "0.0.0.0")
+    WEB_PORT = lazy(loadoption, "WEB_PORT", 8000, int)
+    WEB_BACKLOG = lazy(loadoption, "WEB_BACKLOG", 2048, int)
+    # Процесс перезапускается после стольких запросов (плюс случайно до WEB_MAX_REQUESTS_JITTER), 0 - никогда
+    WEB_MAX_REQUESTS = lazy(loadoption, "WEB_MAX_REQUESTS", 0, int)
+    WEB_MAX_REQUESTS_JITTER = lazy(loadoption, "WEB_MAX_REQUESTS_JITTER", 0, int)
+    # Сколько секунд ждать завершения запросов при остановке процесса
+    WEB_GRACEFUL_TIMEOUT = lazy(loadoption, "WEB_GRACEFUL_TIMEOUT", 30, int)
+    # Адреса и сети прокси (через запятую), чьему X-Forwarded-For верим; * - любым
+    WEB_FORWARDED_ALLOW_IPS = lazy(loadoption, "WEB_FORWARDED_ALLOW_IPS", "127.0.0.1")
+    # Фоновые задачи обслуживания (очистка, архивация); при нескольких процессах - только в первом
+    BACKGROUND_JOBS = lazy(loadoption, "BACKGROUND_JOBS", True, asbool)
+
+    # Логирование: plain - синхронно в консоль, queue - JSON через очередь в фоновом потоке
+    LOG_MODE = lazy(loadoption, "LOG_MODE", "plain")
+    # Сколько предупреждений одного типа в секунду пропускать (0 - без прореживания)
+    LOG_SAMPLE_RATE = lazy(loadoption, "LOG_SAMPLE_RATE", 20, int)
+
+    # Эндпоинт /metrics и замеры запросов к HTTP и БД
+    METRICS_ENABLED = lazy(loadoption, "METRICS_ENABLED", True, asbool)
+
+    def reset(self):
+        """Забывает прочитанные значения: следующее обращение снова читает окружение и секреты"""
+        self.__dict__.clear()
 
 
 settings = Settings()
@@ -0,0 +1,257 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from logging import getLogger
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import session_lifetime
+from database import SessionLocal
+from metrics import Counter
+from auth_events import EVENT_TYPES
+from models import AuthEvent, PendingTotp, User, UserSession, UserSessionArchive
+from principals import invalidate_principal
+from session_registry import session_registry, warm_session_registry
+from session_store import bump_state_version, session_writer
+from settings import settings
+
+
+logger = getLogger('tasks-logger')
+
+PURGED_ROWS = Counter("maintenance_purged_rows_total", "Rows removed by background jobs", ("table",))
+
+# Изменения пользователей читаются внахлёст: строка с меткой до опроса могла закоммититься после него
+USER_CHANGES_OVERLAP = timedelta(seconds=5)
+_user_changes_since: datetime | None = None
+
+
+async def run_periodically(interval: float, job, *args, delay: float = 0):
+    """Запускает job каждые interval секунд (первый раз - через delay), ошибки логируются и не останавливают цикл"""
+    await asyncio.sleep(delay)
+    while True:
+        try:
+            await job(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f'Background job "{job.__name__}" failed')
+        await asyncio.sleep(interval)
+
+
+async def purge_expired_pending_totp(batch_size: int) -> int:
+    """Удаляет брошенные настройки TOTP пачками по batch_size, возвращает число удалённых"""
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.PENDING_TOTP_TTL_MINUTES)
+    expired = (
+        select(PendingTotp.id)
+        .where(PendingTotp.created_at < cutoff)
+        .order_by(PendingTotp.created_at)
+        .limit(batch_size)
+    )
+
+    purged = 0
+    while True:
+        # Каждая пачка в своей короткой транзакции, чтобы не держать блокировки
+        async with SessionLocal() as db:
+            result = await db.execute(
+                delete(PendingTotp)
+                .where(PendingTotp.id.in_(expired.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        purged += result.rowcount
+        if result.rowcount < batch_size:
+            break
+
+    PURGED_ROWS.inc("pending_totp", amount=purged)
+    logger.info(f'Purged {purged} expired pending TOTP setups')
+    return purged
+
+
+async def archive_expired_sessions(batch_size: int) -> int:
+    """Переносит истёкшие сессии в user_sessions_archive пачками по batch_size.
+
+    Refresh-токены таких сессий уже не принимаются, так что пользователь этого не замечает.
+    Возвращает число перенесённых сессий.
+    """
+    cutoff = datetime.utcnow() - session_lifetime()
+    # Целиком истёкшие месяцы секционированной таблицы - одним INSERT ... SELECT на секцию
+    archived = await archive_session_partitions(cutoff)
+
+    expired = (
+        select(UserSession.id)
+        .where(UserSession.start_time < cutoff)
+        .order_by(UserSession.start_time)
+        .limit(batch_size)
+    )
+
+    while True:
+        # DELETE ... RETURNING и вставка в архив - в одной короткой транзакции на пачку
+        async with SessionLocal() as db:
+            result = await db.execute(
+                delete(UserSession)
+                .where(UserSession.id.in_(expired.scalar_subquery()))
+                .returning(UserSession.id, UserSession.user_id, UserSession.device, UserSession.start_time)
+                .execution_options(synchronize_session=False)
+            )
+            rows = [dict(row) for row in result.mappings()]
+            if rows:
+                await db.execute(insert(UserSessionArchive), rows)
+                await bump_state_version(db, (row["user_id"] for row in rows), revoked=True)
+            await db.commit()
+
+        for row in rows:
+            session_registry.discard(row["id"])
+        archived += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    async with SessionLocal() as db:
+        await create_session_partitions(db, settings.SESSION_PARTITIONS_AHEAD)
+
+    PURGED_ROWS.inc("user_sessions", amount=archived)
+    logger.info(f'Archived {archived} expired sessions')
+    return archived
+
+
+async def purge_old_auth_events(batch_size: int) -> int:
+    """Удаляет события auth_events старше AUTH_EVENTS_RETENTION_DAYS пачками по batch_size.
+
+    Удаляем по каждому типу отдельно, чтобы выборка шла по индексу (event_type, created_at).
+    """
+    cutoff = datetime.utcnow() - timedelta(days=settings.AUTH_EVENTS_RETENTION_DAYS)
+
+    purged = 0
+    for event_type in EVENT_TYPES:
+        expired = (
+            select(AuthEvent.id)
+            .where(AuthEvent.event_type == event_type, AuthEvent.created_at < cutoff)
+            .order_by(AuthEvent.created_at)
+            .limit(batch_size)
+        )
+        while True:
+            async with SessionLocal() as db:
+                result = await db.execute(
+                    delete(AuthEvent)
+                    .where(AuthEvent.id.in_(expired.scalar_subquery()))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            purged += result.rowcount
+            if result.rowcount < batch_size:
+                break
+
+    PURGED_ROWS.inc("auth_events", amount=purged)
+    logger.info(f'Purged {purged} old auth events')
+    return purged
+
+
+async def refresh_session_registry():
+    """Перечитывает карту сессий, чтобы узнать о сессиях, завершённых в других процессах"""
+    async with SessionLocal() as db:
+        # Отложенные сессии этого процесса должны попасть в выборку
+        await warm_session_registry(db, before_load=session_writer.flush)
+
+
+async def poll_user_changes() -> int:
+    """Отмечает в реестре сессий пользователей, чьи сессии удалялись с прошлого опроса, и сбрасывает
+    из кеша пользователей, включивших TOTP, - в том числе в других процессах. Возвращает число затронутых.
+
+    Новые сессии карте не нужны (неизвестный бит и так проверяется в БД), поэтому вход
+    пользователя не отмечает: его токены по-прежнему проверяются без запроса.
+    """
+    global _user_changes_since
+    started = datetime.utcnow()
+    since = (_user_changes_since or started) - USER_CHANGES_OVERLAP
+    async with SessionLocal() as db:
+        # Индексы ix_users_sessions_revoked_at и ix_users_state_changed_at
+        revoked = (await db.scalars(select(User.id).where(User.sessions_revoked_at > since))).all()
+        changed = (await db.scalars(select(User.id).where(User.state_changed_at > since))).all()
+    session_registry.mark_changed(revoked)
+    for user_id in changed:
+        invalidate_principal(user_id)
+    _user_changes_since = started
+    return len(set(revoked) | set(changed))
+
+
+SESSION_PARTITION_PREFIX = "user_sessions_p"
+
+
+def next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+async def session_partitions(db: AsyncSession) -> list[str] | None:
+    """Секции user_sessions, секционированной миграцией 9d4b2e6f8a13 или scripts/partition_sessions.py;
+    None, если таблица не секционирована
+    """
+    if db.bind.dialect.name != "postgresql":
+        return None
+    partitioned = await db.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('user_sessions'))"
+    ))
+    if not partitioned:
+        return None
+    return list(await db.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'user_sessions'::regclass"
+    )))
+
+
+async def archive_session_partitions(cutoff: datetime) -> int:
+    """Переносит в архив помесячные секции, целиком старше cutoff, и удаляет их.
+
+    Секция копируется одним INSERT ... SELECT, отсоединяется и удаляется - без построчного
+    DELETE и последующего VACUUM. Реестр сессий не чистится поштучно: токены таких сессий
+    давно не принимаются, а записи уйдут при следующем перечитывании реестра.
+    Возвращает число перенесённых сессий.
+    """
+    async with SessionLocal() as db:
+        partitions = await session_partitions(db)
+    if not partitions:
+        return 0
+
+    archived = 0
+    for name in sorted(partitions):
+        if not name.startswith(SESSION_PARTITION_PREFIX):
+            continue
+        start = datetime.strptime(name[len(SESSION_PARTITION_PREFIX):], "%Y%m").date()
+        if datetime.combine(next_month(start), datetime.min.time()) > cutoff:
+            continue
+
+        # Копия, смена версий и отсоединение - в одной транзакции на секцию
+        async with SessionLocal() as db:
+            result = await db.execute(text(
+                "INSERT INTO user_sessions_archive (id, user_id, device, start_time, archived_at) "
+                f"SELECT id, user_id, device, start_time, now() AT TIME ZONE 'utc' FROM {name}"
+            ))
+            await db.execute(text(
+                "UPDATE users SET state_version = state_version + 1, sessions_revoked_at = now() AT TIME ZONE 'utc' "
+                f"WHERE id IN (SELECT user_id FROM {name})"
+            ))
+            await db.execute(text(f"ALTER TABLE user_sessions DETACH PARTITION {name}"))
+            await db.execute(text(f"DROP TABLE {name}"))
+            await db.commit()
+        archived += result.rowcount
+        logger.info(f'Archived partition {name} with {result.rowcount} sessions')
+    return archived
+
+
+async def create_session_partitions(db: AsyncSession, months_ahead: int) -> int:
+    """Создаёт недостающие секции user_sessions на months_ahead месяцев вперёд, возвращает их число"""
+    partitions = await session_partitions(db)
+    if partitions is None:
+        return 0
+
+    created = 0
+    month = date.today().replace(day=1)
+    for _ in range(months_ahead + 1):
+        name = f"{SESSION_PARTITION_PREFIX}{month:%Y%m}"
+        if name not in partitions:
+            await db.execute(text(
+                f"CREATE TABLE {name} PARTITION OF user_sessions "
+                f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}')"
+            ))
+            created += 1
+        month = next_month(month)
+    await db.commit()
+    return created
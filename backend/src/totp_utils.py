@@ -1,37 +1,197 @@
-import pyotp
-import qrcode
+import asyncio
+import hmac
+import struct
+import time
+from functools import lru_cache
+from hashlib import sha1
+from typing import TYPE_CHECKING, Iterable, Literal
 from io import BytesIO
 import base64
+from urllib.parse import quote
+
+from cache import TTLCache
+from metrics import CallbackMetric, Counter
+from settings import settings
+
+if TYPE_CHECKING:
+    import qrcode
+
+QRFormat = Literal["png", "svg", "uri"]
+
+# Готовые QR-коды по (логин, секрет, формат), чтобы повторные открытия настройки не рендерили заново
+qr_cache = TTLCache(maxsize=1024, ttl=settings.PENDING_TOTP_TTL_MINUTES * 60)
+
+TOTP_VERIFICATIONS = Counter("totp_verifications_total", "TOTP codes checked", ("result",))
+CallbackMetric(
+    "qr_cache_requests_total", "Rendered QR code cache lookups",
+    lambda: {("hit",): qr_cache.hits, ("miss",): qr_cache.misses},
+    type="counter", labels=("result",)
+)
+
+
+def preload():
+    """Импортирует qrcode (и PIL) заранее - для прогрева перед fork в src/server.py.
+
+    Иначе модули загружаются при первой настройке TOTP, а не при старте приложения.
+    """
+    import pyotp  # noqa: F401
+    import qrcode.image.pil  # noqa: F401
 
 
 def generate_totp_secret() -> str:
     """Генерирует секретный ключ для TOTP"""
+    import pyotp
+
     return pyotp.random_base32()
 
 
-def generate_qr_code(username: str, secret: str) -> str:
-    """Генерирует QR-код для Google Authenticator"""
-    totp_uri = pyotp.totp.TOTP(secret).provisioning_uri(
+def get_provisioning_uri(username: str, secret: str) -> str:
+    """Ссылка otpauth:// для Google Authenticator"""
+    import pyotp
+
+    return pyotp.totp.TOTP(secret).provisioning_uri(
         name=username,
         issuer_name="bezrook"
     )
-    
+
+
+def _make_qr(totp_uri: str) -> "qrcode.QRCode":
+    import qrcode
+
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(totp_uri)
     qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
+    return qr
+
+
+def render_png(totp_uri: str) -> str:
+    """QR-код как PNG data URI"""
+    img = _make_qr(totp_uri).make_image(fill_color="black", back_color="white")
+
     # Конвертируем изображение в base64
     buffer = BytesIO()
     img.save(buffer, format="PNG")
     img_str = base64.b64encode(buffer.getvalue()).decode()
-    
+
     return f"data:image/png;base64,{img_str}"
 
 
+def render_svg(totp_uri: str) -> str:
+    """QR-код как SVG data URI: одна линия на каждую серию тёмных модулей в строке, без PIL"""
+    matrix = _make_qr(totp_uri).get_matrix()
+    size = len(matrix)
+
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                path.append(f"M{start} {y}.5h{x - start}")
+            else:
+                x += 1
+
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}">'
+        f'<path fill="#fff" d="M0 0h{size}v{size}H0z"/>'
+        f'<path stroke="#000" d="{"".join(path)}"/></svg>'
+    )
+    return "data:image/svg+xml;utf8," + quote(svg, safe=" /:=.,\"")
+
+
+def generate_qr_code(username: str, secret: str, fmt: QRFormat = "png") -> str | None:
+    """Генерирует QR-код для Google Authenticator; для формата uri картинки нет"""
+    if fmt == "uri":
+        return None
+
+    totp_uri = get_provisioning_uri(username, secret)
+    if fmt == "svg":
+        return render_svg(totp_uri)
+    return render_png(totp_uri)
+
+
+async def generate_qr_code_async(username: str, secret: str, fmt: QRFormat = "png") -> str | None:
+    """То же, что generate_qr_code, но с кешем и рендерингом вне event loop"""
+    if fmt == "uri":
+        return None
+
+    key = (username, secret, fmt)
+    qr_code = qr_cache.get(key)
+    if qr_code is None:
+        qr_code = await asyncio.to_thread(generate_qr_code, username, secret, fmt)
+        qr_cache.set(key, qr_code)
+    return qr_code
+
+
+TOTP_INTERVAL = 30
+TOTP_DIGITS = 6
+TOTP_VALID_WINDOW = 1  # позволяем небольшую погрешность во времени
+
+
+@lru_cache(maxsize=65536)
+def _secret_key(secret: str) -> bytes:
+    """Раскодированный base32-секрет, как его понимает pyotp"""
+    return base64.b32decode(secret.upper() + "=" * (-len(secret) % 8), casefold=True)
+
+
+def _totp_at(key: bytes, counter: int) -> bytes:
+    digest = hmac.new(key, struct.pack(">Q", counter), sha1).digest()
+    offset = digest[-1] & 0x0F
+    value = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(value % 10 ** TOTP_DIGITS).zfill(TOTP_DIGITS).encode()
+
+
+def _valid_codes(secret: str, counter: int) -> tuple[bytes, ...]:
+    key = _secret_key(secret)
+    return tuple(
+        _totp_at(key, counter + shift)
+        for shift in range(-TOTP_VALID_WINDOW, TOTP_VALID_WINDOW + 1)
+    )
+
+
+def _matches(code: bytes, valid_codes: tuple[bytes, ...]) -> bool:
+    # Сравниваем со всеми кодами окна, не прерываясь на первом совпадении
+    result = False
+    for valid_code in valid_codes:
+        result |= hmac.compare_digest(code, valid_code)
+    return result
+
+
+def _check_codes(items: Iterable[tuple[str, str]], for_time: float | None) -> list[bool]:
+    counter = int(time.time() if for_time is None else for_time) // TOTP_INTERVAL
+    windows = {}
+    results = []
+    for secret, code in items:
+        valid_codes = windows.get(secret)
+        if valid_codes is None:
+            valid_codes = windows[secret] = _valid_codes(secret, counter)
+        results.append(_matches(str(code).encode(), valid_codes))
+    return results
+
+
+def _count_results(results: list[bool]):
+    valid = sum(results)
+    TOTP_VERIFICATIONS.inc("valid", amount=valid)
+    TOTP_VERIFICATIONS.inc("invalid", amount=len(results) - valid)
+
+
+def verify_totp_codes(items: Iterable[tuple[str, str]], for_time: float | None = None) -> list[bool]:
+    """Проверяет пачку пар (секрет, код); коды окна считаются один раз на секрет"""
+    results = _check_codes(items, for_time)
+    _count_results(results)
+    return results
+
+
+async def verify_totp_codes_async(items: Iterable[tuple[str, str]], for_time: float | None = None) -> list[bool]:
+    """То же, что verify_totp_codes, но в потоке: большая пачка не задерживает другие запросы процесса"""
+    results = await asyncio.to_thread(_check_codes, list(items), for_time)
+    # Счётчики метрик - в потоке event loop, как и все остальные их изменения
+    _count_results(results)
+    return results
+
+
 def verify_totp_code(secret: str, code: str) -> bool:
     """Проверяет TOTP код"""
-    totp = pyotp.TOTP(secret)
-    return totp.verify(code, valid_window=1)  # valid_window=1 позволяем небольшую погрешность во времени
-
+    return verify_totp_codes([(secret, code)])[0]
@@ -1,48 +1,54 @@
 # backend/tests/conftest.py
+import os
+import tempfile
+
 import pytest
+
+# Приложение работает с тестовой SQLite через aiosqlite, фикстуры пишут в тот же файл синхронно
+TEST_DB_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{TEST_DB_PATH}"
+
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from src.main import app, sessions, user
+from src.main import app
 from src.models import Base, User, UserSession
 from src.auth import get_password_hash
+from auth import token_cache
+from principals import principal_cache
+from ratelimit import login_limiter, ip_limiter
 
 
 # Тестовый движок (session scope)
 @pytest.fixture(scope="session")
 def test_engine():
-    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
-    Base.metadata.create_all(bind=engine)
+    engine = create_engine(f"sqlite:///{TEST_DB_PATH}")
     yield engine
-    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
 
 
-# Транзакционная БД-сессия (function scope)
+# Чистая БД-сессия (function scope)
 @pytest.fixture
 def db(test_engine):
-    connection = test_engine.connect()
-    transaction = connection.begin()
-    session = sessionmaker(bind=connection)()
+    Base.metadata.create_all(bind=test_engine)
+    principal_cache.clear()
+    token_cache.clear()
+    login_limiter.clear()
+    ip_limiter.clear()
+    session = sessionmaker(bind=test_engine)()
 
     yield session
 
     session.close()
-    transaction.rollback()
-    connection.close()
+    Base.metadata.drop_all(bind=test_engine)
 
 
-# TestClient с подменой зависимостей
+# TestClient поверх тестовой БД
 @pytest.fixture
 def client(db):
-    def override_get_db():
-        yield db
-
-    app.dependency_overrides[sessions.get_db] = override_get_db
-    app.dependency_overrides[user.get_db]
     with TestClient(app) as c:
         yield c
-    app.dependency_overrides.clear()
 
 
 # Зарегистрированный пользователь ===
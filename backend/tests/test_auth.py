@@ -1,4 +1,6 @@
 # backend/tests/test_auth.py
+import pytest
+
 
 def test_register_new_user(client):
     response = client.post("/api/register", json={"login": "alice", "password": "secret123"})
@@ -43,3 +45,250 @@ def test_get_user_authorized(client, auth_headers):
     assert data["username"] == "testuser"
     assert "signup_date" in data
     assert isinstance(data["totp_enabled"], bool)
+
+
+def test_login_hashing_queue_full(client, registered_user, monkeypatch):
+    from settings import settings
+
+    monkeypatch.setattr(settings, "HASH_QUEUE_LIMIT", 0)
+    user, password = registered_user
+    response = client.post("/api/login", json={"login": user.login, "password": password})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_hash_pool_recovers_after_worker_death():
+    import asyncio
+    import os
+    from concurrent.futures.process import BrokenProcessPool
+    import auth
+
+    async def run():
+        # Процесс умирает и при повторе: ошибка доходит до вызывающего, но пул пересоздан
+        with pytest.raises(BrokenProcessPool):
+            await auth._run_in_hash_executor("verify", os._exit, 1)
+        return await auth.hash_password_async("secret")
+
+    try:
+        assert auth.verify_password("secret", asyncio.run(run()))
+    finally:
+        auth.shutdown_hash_executor()
+
+
+def test_verify_token_is_cached():
+    import auth
+
+    token = auth.create_access_token(data={"sub": "1"})
+    hits = auth.token_cache.hits
+    assert auth.verify_token(token)["sub"] == "1"
+    assert auth.verify_token(token)["sub"] == "1"
+    assert auth.token_cache.hits == hits + 1
+
+
+def test_verify_token_after_secret_rotation(monkeypatch):
+    import auth
+    from jwt_keys import KeyRing
+
+    token = auth.create_access_token(data={"sub": "1"})
+    assert auth.verify_token(token) is not None
+
+    monkeypatch.setattr(auth, "_jwt_keys", KeyRing(secret="rotated-secret"))
+    errors = auth.token_errors["JWTError"]
+    assert auth.verify_token(token) is None
+    assert auth.token_errors["JWTError"] == errors + 1
+
+
+def _pem(private_key, public=False):
+    from cryptography.hazmat.primitives import serialization
+
+    if public:
+        return private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+@pytest.mark.parametrize("algorithm", ["RS256", "ES256"])
+def test_asymmetric_token_key_rotation(monkeypatch, algorithm):
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+    from jose import jwt
+    import auth
+    from jwt_keys import KeyRing
+
+    def generate():
+        if algorithm == "RS256":
+            return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return ec.generate_private_key(ec.SECP256R1())
+
+    old_key, new_key = generate(), generate()
+
+    # Шаг 1: подписывает старый ключ, новый уже опубликован
+    monkeypatch.setattr(auth, "_jwt_keys", KeyRing(_pem(old_key), _pem(new_key, public=True), secret="legacy-secret"))
+    legacy_token = jwt.encode({"sub": "0"}, "legacy-secret", algorithm="HS256")
+    old_token = auth.create_access_token(data={"sub": "1"})
+    header = jwt.get_unverified_header(old_token)
+    assert header["alg"] == algorithm
+    jwks = auth.get_jwt_keys().jwks["keys"]
+    assert {key["kid"] for key in jwks} == {header["kid"], KeyRing(_pem(new_key)).signing_kid}
+    assert all("d" not in key for key in jwks)
+    # Другой сервис проверяет токен по JWKS без общего секрета
+    published = next(key for key in jwks if key["kid"] == header["kid"])
+    assert jwt.decode(old_token, published, algorithms=[algorithm])["sub"] == "1"
+
+    # Шаг 2: подписывает новый ключ, старый только проверяет
+    monkeypatch.setattr(
+        auth, "_jwt_keys", KeyRing(_pem(new_key), _pem(old_key, public=True), secret="legacy-secret", legacy_secret=True)
+    )
+    new_token = auth.create_access_token(data={"sub": "2"})
+    assert jwt.get_unverified_header(new_token)["kid"] != header["kid"]
+    assert auth.verify_token(old_token)["sub"] == "1"
+    assert auth.verify_token(new_token)["sub"] == "2"
+    # Токены без kid проверяются общим секретом, только если это явно разрешено
+    assert auth.verify_token(legacy_token)["sub"] == "0"
+    monkeypatch.setattr(auth, "_jwt_keys", KeyRing(_pem(new_key), _pem(old_key, public=True), secret="legacy-secret"))
+    assert auth.verify_token(legacy_token) is None
+
+    # Шаг 3: старый ключ убран
+    monkeypatch.setattr(auth, "_jwt_keys", KeyRing(_pem(new_key)))
+    errors = auth.token_errors["UnknownKeyId"]
+    assert auth.verify_token(old_token) is None
+    assert auth.verify_token(legacy_token) is None
+    assert auth.token_errors["UnknownKeyId"] == errors + 2
+    assert auth.verify_token(new_token)["sub"] == "2"
+
+
+def test_hmac_token_with_asymmetric_kid_is_rejected(monkeypatch):
+    import json
+    from cryptography.hazmat.primitives.asymmetric import ec
+    import auth
+    from jwt_keys import KeyRing
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    monkeypatch.setattr(auth, "_jwt_keys", KeyRing(_pem(key)))
+    kid = auth.get_jwt_keys().signing_kid
+    # Подмена алгоритма: HS256 с открытым ключом в роли секрета
+    import hmac
+    from hashlib import sha256
+    from jose.utils import base64url_encode
+
+    signing_input = b".".join(
+        base64url_encode(json.dumps(part).encode()) for part in ({"alg": "HS256", "kid": kid}, {"sub": "1"})
+    )
+    signature = hmac.new(_pem(key, public=True).encode(), signing_input, sha256).digest()
+    forged = (signing_input + b"." + base64url_encode(signature)).decode()
+    assert auth.verify_token(forged) is None
+
+
+def test_jwks_endpoint(client):
+    import auth
+
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert response.json() == auth.get_jwt_keys().jwks
+    assert "max-age" in response.headers["Cache-Control"]
+
+
+def test_verify_token_expired(monkeypatch):
+    import auth
+    from settings import settings
+
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_TTL_MINUTES", -1)
+    token = auth.create_access_token(data={"sub": "1"})
+    errors = auth.token_errors["ExpiredSignatureError"]
+    assert auth.verify_token(token) is None
+    assert auth.token_errors["ExpiredSignatureError"] == errors + 1
+
+
+def test_login_rehashes_outdated_hash(client, db):
+    from passlib.context import CryptContext
+    from src.models import User
+
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password123")
+    user = User(login="legacy", password_hash=old_hash)
+    db.add(user)
+    db.commit()
+
+    response = client.post("/api/login", json={"login": "legacy", "password": "password123"})
+    assert response.status_code == 200
+
+    db.refresh(user)
+    assert user.password_hash != old_hash
+    assert user.password_hash.startswith("$2b$12$")
+    response = client.post("/api/login", json={"login": "legacy", "password": "password123"})
+    assert response.status_code == 200
+
+
+def test_argon2_context_upgrades_bcrypt(monkeypatch):
+    pytest.importorskip("argon2")
+    import auth
+    from settings import settings
+
+    monkeypatch.setattr(settings, "ARGON2_MEMORY_COST", 1024)
+    monkeypatch.setattr(settings, "ARGON2_TIME_COST", 1)
+    context = auth.build_pwd_context("argon2")
+
+    bcrypt_hash = auth.build_pwd_context("bcrypt").hash("secret")
+    verified, new_hash = context.verify_and_update("secret", bcrypt_hash)
+    assert verified
+    assert new_hash.startswith("$argon2id$v=19$m=1024,t=1,")
+    assert context.verify("secret", new_hash)
+    assert not context.needs_update(new_hash)
+
+    with pytest.raises(ValueError):
+        auth.build_pwd_context("md5")
+
+
+def test_user_is_answered_from_token(client, db, registered_user, auth_headers):
+    user, _ = registered_user
+    user.login = "renamed"
+    db.commit()
+    # /api/user отвечает по claims токена, не заглядывая в БД
+    response = client.get("/api/user", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "testuser"
+
+
+def test_user_not_modified(client, auth_headers):
+    etag = client.get("/api/user", headers=auth_headers).headers["ETag"]
+
+    for header in (etag, f'"other", W/{etag}', "*"):
+        response = client.get("/api/user", headers={**auth_headers, "If-None-Match": header})
+        assert response.status_code == 304 and response.headers["ETag"] == etag
+    assert client.get("/api/user", headers={**auth_headers, "If-None-Match": '"other"'}).status_code == 200
+
+
+def test_refresh_token_rotation(client, registered_user):
+    user, password = registered_user
+    login = client.post("/api/login", json={"login": user.login, "password": password}).json()
+    assert login["expires_in"] == 15 * 60
+
+    response = client.post("/api/token/refresh", json={"refresh_token": login["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != login["refresh_token"]
+    assert client.get("/api/user", headers={"Authorization": f"Bearer {rotated['token']}"}).status_code == 200
+
+    # Старый refresh-токен больше не принимается, новый - принимается
+    response = client.post("/api/token/refresh", json={"refresh_token": login["refresh_token"]})
+    assert response.status_code == 401
+    response = client.post("/api/token/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("refresh_token", ["", "garbage", "1.", "999999.secret"])
+def test_refresh_token_invalid(client, refresh_token):
+    response = client.post("/api/token/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 401
+
+
+def test_refresh_token_of_terminated_session(client, registered_user):
+    user, password = registered_user
+    login = client.post("/api/login", json={"login": user.login, "password": password}).json()
+    headers = {"Authorization": f"Bearer {login['token']}"}
+    session_id = client.get("/api/sessions", headers=headers).json()["sessions"][0]["id"]
+    client.delete(f"/api/sessions/{session_id}", headers=headers)
+
+    response = client.post("/api/token/refresh", json={"refresh_token": login["refresh_token"]})
+    assert response.status_code == 401
@@ -0,0 +1,80 @@
+# backend/tests/test_auth_events.py
+import asyncio
+from datetime import datetime, timedelta
+
+from src.models import AuthEvent
+
+
+def flush_events(client):
+    from auth_events import event_writer
+
+    client.portal.call(event_writer.flush)
+
+
+def test_login_events_are_queryable(client, registered_user, auth_headers):
+    user, _ = registered_user
+    assert client.post("/api/login", json={"login": user.login, "password": "wrong"}).status_code == 401
+    assert client.post("/api/login", json={"login": "nobody", "password": "wrong"}).status_code == 401
+
+    # Запрос не сбрасывает буфер: события видны после записи пачки
+    flush_events(client)
+    response = client.get("/api/events", headers=auth_headers)
+    assert response.status_code == 200
+    events = response.json()["events"]
+    # Новые первыми; неудачный вход чужого логина не виден
+    assert [e["event_type"] for e in events] == ["login_failed", "login_success"]
+    assert events[0]["login"] == user.login and events[0]["ip"]
+    assert events[1]["session_id"]
+    assert datetime.fromisoformat(events[0]["created_at"])
+
+
+def test_events_pagination_and_filter(client, db, registered_user, auth_headers):
+    user, _ = registered_user
+    started = datetime.utcnow() - timedelta(hours=1)
+    for i in range(5):
+        db.add(AuthEvent(user_id=user.id, event_type="totp_invalid", created_at=started + timedelta(minutes=i)))
+    db.commit()
+
+    first = client.get("/api/events", params={"limit": 4, "event_type": "totp_invalid"}, headers=auth_headers).json()
+    assert len(first["events"]) == 4 and first["next_cursor"]
+    second = client.get(
+        "/api/events", params={"limit": 4, "event_type": "totp_invalid", "cursor": first["next_cursor"]},
+        headers=auth_headers
+    ).json()
+    assert len(second["events"]) == 1 and second["next_cursor"] is None
+
+    times = [e["created_at"] for e in first["events"] + second["events"]]
+    assert times == sorted(times, reverse=True)
+
+    assert client.get("/api/events?event_type=unknown", headers=auth_headers).status_code == 422
+
+
+def test_session_termination_is_recorded(client, db, user_with_sessions, auth_headers):
+    assert client.post("/api/sessions/terminate-others", headers=auth_headers).json()["terminated"] == 2
+
+    flush_events(client)
+    events = client.get("/api/events?event_type=session_terminated", headers=auth_headers).json()["events"]
+    assert len(events) == 2 and all(e["session_id"] for e in events)
+
+
+def test_record_event_never_waits():
+    from auth_events import event_writer, record_event
+
+    # Writer не запущен: событие отбрасывается без обращения к БД
+    assert not event_writer.running
+    assert record_event("login_failed", login="x") is False
+
+
+def test_purge_old_auth_events(client, db, registered_user):
+    from tasks import purge_old_auth_events
+
+    user, _ = registered_user
+    old = datetime.utcnow() - timedelta(days=91)
+    for i in range(3):
+        db.add(AuthEvent(user_id=user.id, event_type="login_failed", created_at=old))
+        db.add(AuthEvent(user_id=user.id, event_type="totp_invalid", created_at=old))
+    db.add(AuthEvent(user_id=user.id, event_type="login_failed", created_at=datetime.utcnow()))
+    db.commit()
+
+    assert asyncio.run(purge_old_auth_events(2)) == 6
+    assert db.query(AuthEvent).count() == 1
@@ -0,0 +1,36 @@
+# backend/tests/test_cache.py
+import cache
+from cache import TTLCache
+
+
+def test_lru_eviction():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1}
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=10, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2, ttl=5)
+    now[0] += 10
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    now[0] += 60
+    assert c.get("a") is None
+    assert len(c) == 0
+
+
+def test_invalidate():
+    c = TTLCache(maxsize=10, ttl=60)
+    c.set("a", 1)
+    c.invalidate("a")
+    c.invalidate("missing")
+    assert c.get("a") is None
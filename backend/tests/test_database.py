@@ -0,0 +1,20 @@
+# backend/tests/test_database.py
+from sqlalchemy.pool import NullPool
+
+from database import engine_options
+from settings import settings
+
+
+def test_sqlite_engine_has_no_pool():
+    assert engine_options("sqlite+aiosqlite:///test.db") == {"poolclass": NullPool}
+
+
+def test_postgres_engine_uses_pool_settings(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 3)
+    monkeypatch.setattr(settings, "DB_STATEMENT_CACHE_SIZE", 0)
+    options = engine_options("postgresql+asyncpg://u:p@db/bezrook")
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == settings.DB_MAX_OVERFLOW
+    assert options["pool_pre_ping"] is settings.DB_POOL_PRE_PING
+    assert options["pool_recycle"] == settings.DB_POOL_RECYCLE
+    assert options["connect_args"] == {"prepared_statement_cache_size": 0}
@@ -0,0 +1,57 @@
+# backend/tests/test_import_users.py
+import io
+
+from scripts.import_users import import_users
+from src.auth import get_password_hash, verify_password
+from src.models import User
+from tests.conftest import TEST_DB_PATH
+
+
+def test_import_users_csv(db, registered_user):
+    prehashed = get_password_hash("imported-hash")
+    data = io.StringIO(
+        "login,password,password_hash\n"
+        "carol,carol-pass,\n"
+        f"dave,,{prehashed}\n"
+        "testuser,other,\n"       # уже есть в базе
+        "carol,again,\n"          # повтор в файле
+        "erin,,not-a-hash\n"
+        ",nologin,\n"
+    )
+
+    stats = import_users(data, "csv", f"sqlite:///{TEST_DB_PATH}", batch_size=2, workers=1)
+
+    assert (stats.read, stats.inserted, stats.skipped, stats.invalid) == (6, 2, 2, 2)
+    assert sorted(stats.invalid_lines) == [
+        "line 6: unknown password_hash format", "line 7: login and password or password_hash required"
+    ]
+    users = {user.login: user for user in db.query(User)}
+    assert set(users) == {"testuser", "carol", "dave"}
+    assert verify_password("carol-pass", users["carol"].password_hash)
+    assert users["dave"].password_hash == prehashed
+    assert users["dave"].created_at is not None
+
+
+def test_import_users_jsonl_skips_existing(db):
+    data = io.StringIO('{"login": "frank", "password": "p1"}\n\n{"login": "frank", "password": "p2"}\n')
+    stats = import_users(data, "jsonl", f"sqlite:///{TEST_DB_PATH}", workers=1)
+    assert (stats.inserted, stats.skipped) == (1, 1)
+
+    data = io.StringIO('{"login": "frank", "password": "p3"}\n')
+    stats = import_users(data, "jsonl", f"sqlite:///{TEST_DB_PATH}", workers=1)
+    assert (stats.inserted, stats.skipped) == (0, 1)
+
+
+def test_import_users_jsonl_reports_broken_lines(db):
+    data = io.StringIO(
+        '{"login": "gina", "password": "p1"}\n'
+        '{"login": "hank", "password": \n'
+        '["ivan", "p2"]\n'
+        '{"login": 42, "password": "p3"}\n'
+        '{"login": "judy", "password": "p4"}\n'
+    )
+    stats = import_users(data, "jsonl", f"sqlite:///{TEST_DB_PATH}", batch_size=2, workers=1)
+
+    assert (stats.read, stats.inserted, stats.invalid) == (5, 2, 3)
+    assert [line.split(":")[0] for line in stats.invalid_lines] == ["line 2", "line 3", "line 4"]
+    assert {user.login for user in db.query(User)} == {"gina", "judy"}
@@ -0,0 +1,43 @@
+# backend/tests/test_logging.py
+import json
+import logging
+
+from logging_setup import EventSampler, JSONFormatter
+
+
+def make_record(event, level=logging.WARNING, name="user-logger"):
+    record = logging.LogRecord(name, level, __file__, 1, "message %s", ("x",), None)
+    record.event = event
+    return record
+
+
+def test_sampler_limits_each_event_type(monkeypatch):
+    import logging_setup
+
+    monkeypatch.setattr(logging_setup, "monotonic", lambda: 10.0)
+    sampler = EventSampler(rate=2)
+    passed = []
+    for event in ["login_failed"] * 5 + ["totp_invalid"] * 3:
+        passed.append(sampler.filter(make_record(event)))
+    assert passed == [True, True, False, False, False, True, True, False]
+    assert sampler.dropped == 4
+
+    # В следующую секунду первая запись сообщает, сколько было отброшено
+    monkeypatch.setattr(logging_setup, "monotonic", lambda: 11.0)
+    record = make_record("login_failed")
+    assert sampler.filter(record)
+    assert record.suppressed == 3
+
+
+def test_sampler_keeps_info():
+    sampler = EventSampler(rate=0)
+    assert sampler.filter(make_record("login_success", level=logging.INFO))
+
+
+def test_json_formatter():
+    record = make_record("login_failed")
+    data = json.loads(JSONFormatter().format(record))
+    assert data["message"] == "message x"
+    assert data["event"] == "login_failed"
+    assert data["logger"] == "user-logger"
+    assert data["level"] == "WARNING"
@@ -0,0 +1,34 @@
+# backend/tests/test_metrics.py
+from metrics import Counter, Histogram, render
+
+
+def test_histogram_render():
+    histogram = Histogram("test_latency_seconds", "Test latency", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+    counter = Counter("test_events_total", "Test events", ("kind",))
+    counter.inc("x")
+    counter.inc("x", amount=2)
+
+    text = render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{route="/a"} 3' in text
+    assert 'test_events_total{kind="x"} 3' in text
+
+
+def test_metrics_endpoint(client, auth_headers):
+    client.get("/api/user", headers=auth_headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/user",status="200"}' in text
+    assert 'password_hash_duration_seconds_count{operation="verify"}' in text
+    assert 'db_query_duration_seconds_count{statement="SELECT"}' in text
+    assert 'token_cache_requests_total{result="hit"}' in text
+    assert 'principal_cache_size' in text
@@ -0,0 +1,70 @@
+# backend/tests/test_ratelimit.py
+from fastapi.testclient import TestClient
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from ratelimit import SlidingWindowLimiter, ip_limiter, login_limiter
+from src.main import app
+
+
+def test_limiter_blocks_after_limit():
+    limiter = SlidingWindowLimiter(limit=3, window=60, max_keys=10)
+    assert [limiter.hit("a", now=0) for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit("a", now=1) == 59
+    assert limiter.hit("b", now=1) == 0
+    assert limiter.rejected == 1
+
+
+def test_limiter_window_slides():
+    limiter = SlidingWindowLimiter(limit=2, window=60, max_keys=10)
+    limiter.hit("a", now=50)
+    limiter.hit("a", now=55)
+    # В начале следующего окна предыдущие попытки ещё почти полностью учитываются
+    assert limiter.hit("a", now=60) > 0
+    # Ближе к его концу вес старых попыток мал
+    assert limiter.hit("a", now=115) == 0
+    # Через два окна всё забыто
+    assert limiter.hit("a", now=200) == 0
+
+
+def test_limiter_table_is_bounded():
+    limiter = SlidingWindowLimiter(limit=1, window=60, max_keys=2)
+    for key in ("a", "b", "c"):
+        limiter.hit(key, now=0)
+    assert len(limiter) == 2
+    # "a" вытеснен и снова разрешён
+    assert limiter.hit("a", now=0) == 0
+
+
+def test_login_rate_limited_before_password_check(client, registered_user, monkeypatch):
+    user, _ = registered_user
+    monkeypatch.setattr(login_limiter, "limit", 2)
+    for _ in range(2):
+        response = client.post("/api/login", json={"login": user.login, "password": "wrong"})
+        assert response.status_code == 401
+
+    response = client.post("/api/login", json={"login": user.login, "password": "wrong"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_ip_limit_uses_forwarded_address_from_trusted_proxy(db, registered_user, monkeypatch):
+    user, _ = registered_user
+    monkeypatch.setattr(ip_limiter, "limit", 1)
+
+    def attempt(client, forwarded_for):
+        return client.post(
+            "/api/login", json={"login": user.login, "password": "wrong"},
+            headers={"X-Forwarded-For": forwarded_for}
+        ).status_code
+
+    # TestClient подключается с адреса "testclient": как у uvicorn с WEB_FORWARDED_ALLOW_IPS
+    with TestClient(ProxyHeadersMiddleware(app, trusted_hosts="testclient")) as client:
+        assert attempt(client, "203.0.113.1") == 401
+        assert attempt(client, "203.0.113.2") == 401
+        assert attempt(client, "203.0.113.1") == 429
+
+    # От недоверенного соединения заголовок не меняет ключ ограничителя
+    ip_limiter.clear()
+    with TestClient(ProxyHeadersMiddleware(app, trusted_hosts="127.0.0.1")) as client:
+        assert attempt(client, "203.0.113.3") == 401
+        assert attempt(client, "203.0.113.4") == 429
@@ -0,0 +1,67 @@
+# backend/tests/test_server.py
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str) -> int:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.status
+
+
+def test_server_recycles_and_drains_workers(tmp_path):
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite+aiosqlite:///{tmp_path / 'server.db'}",
+        WEB_WORKERS="2", WEB_HOST="127.0.0.1", WEB_PORT=str(port),
+        WEB_MAX_REQUESTS="3", WEB_GRACEFUL_TIMEOUT="5",
+        SESSION_ARCHIVE_INTERVAL="3600", PENDING_TOTP_SWEEP_INTERVAL="3600",
+    )
+    # Таблицы нужны для прогрева карты сессий при старте процессов
+    subprocess.run(
+        [sys.executable, "-c", "from sqlalchemy import create_engine; from models import Base; "
+         f"Base.metadata.create_all(create_engine('sqlite:///{tmp_path / 'server.db'}'))"],
+        cwd=os.path.join(BACKEND_DIR, "src"), env=env, check=True,
+    )
+    log_path = tmp_path / "server.log"
+    with open(log_path, "w") as log:
+        server = subprocess.Popen([sys.executable, "src/server.py"], cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+
+    try:
+        url = f"http://127.0.0.1:{port}/.well-known/jwks.json"
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                assert _get(url) == 200
+                break
+            except OSError:
+                assert time.monotonic() < deadline, log_path.read_text()
+                time.sleep(0.2)
+
+        # Каждый процесс отработает не больше трёх запросов, но сервис отвечает всё время
+        for _ in range(12):
+            assert _get(url) == 200
+            time.sleep(0.15)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        code = server.wait(timeout=20)
+
+    output = log_path.read_text()
+    assert code == 0, output
+    assert "Maximum request limit of 3 exceeded" in output
+    assert output.count("Started worker") > 2
+    assert output.count("Application shutdown complete") >= 2
+    assert "All workers stopped" in output
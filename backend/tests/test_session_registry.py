@@ -0,0 +1,102 @@
+# backend/tests/test_session_registry.py
+import asyncio
+from datetime import datetime
+
+from session_registry import SessionRegistry
+from src.models import UserSession
+
+
+def test_registry_known_ids():
+    registry = SessionRegistry()
+    for session_id in (1, 3, 9):
+        registry.add(session_id)
+    registry.high_water = 9
+
+    assert registry.is_active(3) is True
+    assert registry.is_active(2) is False
+    registry.discard(3)
+    assert registry.is_active(3) is False
+    assert len(registry) == 2
+
+
+def test_registry_unknown_ids_above_high_water():
+    registry = SessionRegistry()
+    registry.high_water = 5
+    assert registry.is_active(6) is None
+    registry.add(6)
+    assert registry.is_active(6) is True
+    registry.discard(100)
+    assert registry.is_active(100) is None
+
+
+def test_registry_reload_keeps_local_changes():
+    registry = SessionRegistry()
+    registry.add(1)
+    registry.add(2)
+    registry.high_water = 2
+
+    registry.track_changes()
+    # Пока карта читается из БД, процесс создаёт сессию 4 (ещё не записана) и завершает 1
+    registry.add(4)
+    registry.discard(1)
+    loaded = SessionRegistry()
+    for session_id in (1, 2, 3):
+        loaded.add(session_id)
+    loaded.high_water = 3
+    registry.replace_with(loaded)
+
+    assert [registry.is_active(i) for i in (1, 2, 3, 4)] == [False, True, True, True]
+    # Отслеживание закончилось вместе с заменой
+    registry.add(5)
+    registry.replace_with(SessionRegistry())
+    assert registry.is_active(5) is None
+
+
+def test_registry_reload_forgets_changed_users():
+    registry = SessionRegistry()
+    registry.mark_changed([1, 2])
+    registry.track_changes()
+    registry.mark_changed([3])
+    registry.replace_with(SessionRegistry())
+    # Изменения 1 и 2 уже в загруженной карте, о 3 узнали во время загрузки
+    assert registry.changed_users == {3}
+
+
+def test_session_terminated_by_another_process(client, db, user_with_sessions, auth_headers):
+    from tasks import poll_user_changes
+
+    assert client.get("/api/user", headers=auth_headers).status_code == 200
+    # Другой процесс завершает сессию: в карте этого процесса бит остаётся
+    session = db.query(UserSession).filter_by(user_id=user_with_sessions.id).order_by(UserSession.id.desc()).first()
+    db.delete(session)
+    user_with_sessions.sessions_revoked_at = datetime.utcnow()
+    db.commit()
+
+    assert asyncio.run(poll_user_changes()) == 1
+    assert client.get("/api/user", headers=auth_headers).status_code == 401
+
+
+def test_login_does_not_mark_user_changed(client, db, registered_user, auth_headers):
+    from sqlalchemy import event
+
+    from database import engine
+    from session_registry import session_registry
+    from tasks import poll_user_changes
+
+    user, _ = registered_user
+    # Вход только что создал сессию, но ничего не завершил
+    assert asyncio.run(poll_user_changes()) == 0
+    assert user.id not in session_registry.changed_users
+
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        assert client.get("/api/user", headers=auth_headers).status_code == 200
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    # Токен проверяется по карте сессий, без запроса в БД
+    assert statements == []
@@ -0,0 +1,101 @@
+# backend/tests/test_session_store.py
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from session_store import SessionIdAllocator, session_writer
+from settings import settings
+from src.main import app
+from src.models import UserSession
+
+
+def login(client, user, password):
+    response = client.post("/api/login", json={"login": user.login, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture
+def write_behind(monkeypatch, db):
+    def enable(mode, interval=0.05):
+        monkeypatch.setattr(settings, "SESSION_WRITE_MODE", mode)
+        monkeypatch.setattr(session_writer, "interval", interval)
+    return enable
+
+
+def test_group_mode_commits_before_response(write_behind, db, registered_user):
+    write_behind("group")
+    user, password = registered_user
+    with TestClient(app) as client:
+        headers = login(client, user, password)
+        assert db.query(UserSession).filter_by(user_id=user.id).count() == 1
+        assert client.get("/api/user", headers=headers).status_code == 200
+
+
+def test_async_mode_flushes_on_shutdown(write_behind, db, registered_user):
+    write_behind("async", interval=60)
+    user, password = registered_user
+    with TestClient(app) as client:
+        headers = [login(client, user, password) for _ in range(3)]
+        assert db.query(UserSession).filter_by(user_id=user.id).count() == 0
+        # До записи в базу токен принимается по реестру сессий процесса
+        assert client.get("/api/user", headers=headers[0]).status_code == 200
+
+    assert db.query(UserSession).filter_by(user_id=user.id).count() == 3
+
+
+def test_async_mode_bumps_version_with_batch(write_behind, db, registered_user):
+    write_behind("async", interval=60)
+    user, password = registered_user
+    with TestClient(app) as client:
+        headers = login(client, user, password)
+        etag = client.get("/api/sessions", headers=headers).headers["ETag"]
+        login(client, user, password)
+        # Пока пачка не записана, версия прежняя: ETag не опережает данные
+        assert client.get("/api/sessions", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+        client.portal.call(session_writer.flush)
+        response = client.get("/api/sessions", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200 and len(response.json()["sessions"]) == 2
+
+
+def test_async_mode_terminate_sees_pending_sessions(write_behind, db, registered_user):
+    write_behind("async", interval=60)
+    user, password = registered_user
+    with TestClient(app) as client:
+        first = login(client, user, password)
+        second = login(client, user, password)
+
+        response = client.post("/api/sessions/terminate-others", headers=second)
+        assert response.json()["terminated"] == 1
+        assert client.get("/api/user", headers=first).status_code == 401
+        assert client.get("/api/user", headers=second).status_code == 200
+
+
+def test_async_mode_failed_batch_revokes_tokens(write_behind, db, registered_user, monkeypatch):
+    write_behind("async", interval=60)
+    user, password = registered_user
+    with TestClient(app) as client:
+        headers = login(client, user, password)
+        assert client.get("/api/user", headers=headers).status_code == 200
+
+        async def fail(db, rows):
+            raise RuntimeError("database is gone")
+
+        monkeypatch.setattr(session_writer, "before_commit", fail)
+        client.portal.call(session_writer.flush)
+        assert client.get("/api/user", headers=headers).status_code == 401
+    assert db.query(UserSession).filter_by(user_id=user.id).count() == 0
+
+
+def test_allocator_continues_after_max_id(db, user_with_sessions):
+    from database import SessionLocal
+
+    async def allocate():
+        allocator = SessionIdAllocator(block=2)
+        async with SessionLocal() as db:
+            return [await allocator.next(db) for _ in range(5)]
+
+    top = max(session.id for session in db.query(UserSession))
+    assert asyncio.run(allocate()) == list(range(top + 1, top + 6))
@@ -29,6 +29,22 @@ def test_get_sessions_with_data(client, db, user_with_sessions, auth_headers):
     assert all(not s["is_current"] for s in sessions[:-1])
 
 
+def test_sessions_response_format(client, db, registered_user, auth_headers):
+    from datetime import datetime
+
+    user, _ = registered_user
+    start_time = datetime(2025, 3, 7, 9, 5)
+    db.add(UserSession(user_id=user.id, device="FORMAT", start_time=start_time))
+    db.commit()
+
+    response = client.get("/api/sessions", headers=auth_headers)
+    assert response.headers["content-type"] == "application/json"
+    session = response.json()["sessions"][0]
+    assert session["device"] == "FORMAT"
+    assert session["start_time"] == start_time.strftime("%H:%M %d-%m-%Y") == "09:05 07-03-2025"
+    assert session["is_current"] is False
+
+
 def test_terminate_session_success(client, db, registered_user, auth_headers):
     user, _ = registered_user
     # Создаём дополнительную сессию
@@ -66,3 +82,145 @@ def test_terminate_session_other_user_forbidden(client, db, auth_headers):
     response = client.delete(f"/api/sessions/{other_id}", headers=auth_headers)
     assert response.status_code == 404
     assert response.json()["detail"] == "Session not found"
+
+
+def test_get_sessions_pagination(client, db, registered_user, auth_headers):
+    user, _ = registered_user
+    for i in range(4):
+        db.add(UserSession(user_id=user.id, device=f"PAGE-{i}"))
+    db.commit()
+
+    first = client.get("/api/sessions?limit=3", headers=auth_headers).json()
+    assert len(first["sessions"]) == 3
+    assert first["next_cursor"]
+
+    second = client.get(
+        "/api/sessions", params={"limit": 3, "cursor": first["next_cursor"]}, headers=auth_headers
+    ).json()
+    assert len(second["sessions"]) == 2
+    assert second["next_cursor"] is None
+
+    ids = [s["id"] for s in first["sessions"] + second["sessions"]]
+    assert len(set(ids)) == 5
+    # Текущая - сессия токена, созданная при логине раньше остальных
+    assert [s["is_current"] for s in first["sessions"]] == [True, False, False]
+    assert not any(s["is_current"] for s in second["sessions"])
+
+
+def test_get_sessions_invalid_cursor(client, auth_headers):
+    response = client.get("/api/sessions?cursor=garbage", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_terminate_sessions_bulk(client, db, user_with_sessions, auth_headers):
+    other_user = User(login="other", password_hash="fake_hash")
+    db.add(other_user)
+    db.commit()
+    other_session = UserSession(user_id=other_user.id, device="OTHER")
+    db.add(other_session)
+    db.commit()
+
+    own_ids = [s.id for s in db.query(UserSession).filter(UserSession.user_id == user_with_sessions.id)][:2]
+    response = client.post(
+        "/api/sessions/terminate",
+        json={"session_ids": own_ids + [other_session.id, 999999]},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["terminated"] == 2
+
+    remaining = db.query(UserSession).filter(UserSession.id.in_(own_ids + [other_session.id])).all()
+    assert [s.id for s in remaining] == [other_session.id]
+
+
+def test_terminate_other_sessions(client, db, user_with_sessions, auth_headers):
+    response = client.post("/api/sessions/terminate-others", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["terminated"] == 2
+
+    sessions = client.get("/api/sessions", headers=auth_headers).json()["sessions"]
+    assert len(sessions) == 1
+    assert sessions[0]["is_current"] is True
+
+
+def test_terminated_session_token_is_rejected(client, auth_headers):
+    current = client.get("/api/sessions", headers=auth_headers).json()["sessions"][-1]
+    assert current["is_current"] is True
+
+    response = client.delete(f"/api/sessions/{current['id']}", headers=auth_headers)
+    assert response.status_code == 200
+
+    response = client.get("/api/user", headers=auth_headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Session has been terminated"
+
+
+def test_token_without_session_is_rejected(client, registered_user):
+    from auth import create_access_token
+
+    user, _ = registered_user
+    token = create_access_token(data={"sub": str(user.id)})
+    response = client.get("/api/user", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+def test_archive_expired_sessions(client, db, registered_user, auth_headers):
+    import asyncio
+    from datetime import datetime, timedelta
+    from src.models import UserSessionArchive
+    from tasks import archive_expired_sessions
+
+    user, _ = registered_user
+    old = datetime.utcnow() - timedelta(days=31)
+    for i in range(5):
+        db.add(UserSession(user_id=user.id, device=f"OLD-{i}", start_time=old + timedelta(minutes=i)))
+    db.commit()
+
+    assert asyncio.run(archive_expired_sessions(2)) == 5
+    db.expire_all()
+    assert db.query(UserSession).filter_by(user_id=user.id).count() == 1
+    archived = db.query(UserSessionArchive).order_by(UserSessionArchive.start_time).all()
+    assert [a.device for a in archived] == [f"OLD-{i}" for i in range(5)]
+    assert all(a.user_id == user.id and a.archived_at for a in archived)
+    # Текущая сессия не тронута
+    assert client.get("/api/sessions", headers=auth_headers).status_code == 200
+
+
+def test_sessions_not_modified(client, db, user_with_sessions, auth_headers):
+    from metrics import render
+
+    first = client.get("/api/sessions", headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    cached = client.get("/api/sessions", headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["ETag"] == etag and not cached.content
+    # Другая страница - другой ETag
+    assert client.get("/api/sessions?limit=1", headers={**auth_headers, "If-None-Match": etag}).status_code == 200
+
+    assert client.post("/api/sessions/terminate-others", headers=auth_headers).status_code == 200
+    changed = client.get("/api/sessions", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(changed.json()["sessions"]) == 1
+
+    assert 'http_conditional_requests_total{route="/api/sessions",result="hit"}' in render()
+
+
+def test_sessions_etag_changes_on_login_and_archive(client, db, registered_user, auth_headers):
+    import asyncio
+    from datetime import datetime, timedelta
+    from tasks import archive_expired_sessions
+
+    user, password = registered_user
+    etag = client.get("/api/sessions", headers=auth_headers).headers["ETag"]
+
+    client.post("/api/login", json={"login": user.login, "password": password})
+    after_login = client.get("/api/sessions", headers={**auth_headers, "If-None-Match": etag})
+    assert after_login.status_code == 200 and len(after_login.json()["sessions"]) == 2
+
+    etag = after_login.headers["ETag"]
+    db.add(UserSession(user_id=user.id, device="OLD", start_time=datetime.utcnow() - timedelta(days=31)))
+    db.commit()
+    asyncio.run(archive_expired_sessions(10))
+    # Сессия, добавленная в обход приложения, видна только после архивации, которая сменила версию
+    assert client.get("/api/sessions", headers={**auth_headers, "If-None-Match": etag}).status_code == 200
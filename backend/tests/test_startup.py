@@ -0,0 +1,55 @@
+# backend/tests/test_startup.py
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Бюджет импорта приложения в микросекундах: main импортируется примерно за 0.4 с,
+# на медленных машинах CI бюджет поднимают переменной окружения
+IMPORT_BUDGET_US = int(os.getenv("IMPORT_BUDGET_US", 600_000))
+
+CHECK = """
+import sys
+import main
+heavy = [name for name in ("qrcode", "PIL", "pyotp") if name in sys.modules]
+assert not heavy, f"imported at startup: {heavy}"
+"""
+
+
+def test_app_import_time_budget(tmp_path):
+    # Без POSTGRES_* и секретов: при заданном DATABASE_URL они не читаются при импорте
+    env = {k: v for k, v in os.environ.items() if not k.startswith("POSTGRES_")}
+    env["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_path / 'startup.db'}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHECK],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    # Строка отчёта: "import time: self [us] | cumulative | module"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, total, name = line.split("|")
+            if total.strip().isdigit():
+                cumulative[name.strip()] = int(total)
+    assert cumulative["main"] < IMPORT_BUDGET_US, sorted(cumulative.items(), key=lambda item: -item[1])[:15]
+
+
+def test_settings_are_read_lazily(monkeypatch):
+    from settings import Settings
+
+    monkeypatch.delenv("POSTGRES_DB", raising=False)
+    settings = Settings()
+    # Обязательная переменная не нужна, пока к ней не обратились
+    monkeypatch.setenv("LOGIN_RATE_WINDOW", "5")
+    assert settings.LOGIN_RATE_WINDOW == 5.0
+
+    monkeypatch.setenv("LOGIN_RATE_WINDOW", "7")
+    assert settings.LOGIN_RATE_WINDOW == 5.0
+    settings.reset()
+    assert settings.LOGIN_RATE_WINDOW == 7.0
+
+    settings.LOGIN_RATE_WINDOW = 1
+    assert settings.LOGIN_RATE_WINDOW == 1
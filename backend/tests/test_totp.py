@@ -0,0 +1,220 @@
+# backend/tests/test_totp.py
+import asyncio
+from datetime import datetime
+
+import pyotp
+
+
+def test_setup_and_confirm_totp(client, auth_headers):
+    setup = client.post("/api/totp/setup", headers=auth_headers)
+    assert setup.status_code == 200
+    secret = setup.json()["secret"]
+
+    # Пользователь закеширован без TOTP
+    user_response = client.get("/api/user", headers=auth_headers)
+    assert user_response.json()["totp_enabled"] is False
+    sessions_etag = client.get("/api/sessions", headers=auth_headers).headers["ETag"]
+
+    response = client.post(
+        "/api/totp/setup/verify",
+        json={"code": pyotp.TOTP(secret).now()},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+
+    # Claims старого токена не меняются, новый токен уже с TOTP и пройденным вторым фактором
+    assert client.get("/api/user", headers=auth_headers).json()["totp_enabled"] is False
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    assert client.get("/api/user", headers=headers).json()["totp_enabled"] is True
+
+    # Старый ETag /api/user не подходит к новым claims, версия пользователя выросла
+    conditional = {"If-None-Match": user_response.headers["ETag"]}
+    assert client.get("/api/user", headers={**auth_headers, **conditional}).status_code == 304
+    assert client.get("/api/user", headers={**headers, **conditional}).status_code == 200
+    assert client.get("/api/sessions", headers={**headers, "If-None-Match": sessions_etag}).status_code == 200
+
+
+def test_confirm_totp_invalid_code(client, auth_headers):
+    client.post("/api/totp/setup", headers=auth_headers)
+    response = client.post("/api/totp/setup/verify", json={"code": "000000"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_verify_totp_not_set_up(client, auth_headers):
+    response = client.post("/api/totp/verify", json={"code": "123456"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_current_user_is_cached(client, auth_headers):
+    from principals import principal_cache
+
+    client.post("/api/totp/setup?format=uri", headers=auth_headers)
+    hits = principal_cache.hits
+    client.post("/api/totp/setup?format=uri", headers=auth_headers)
+    assert principal_cache.hits == hits + 1
+
+
+def test_totp_enabled_by_another_process(client, db, registered_user, auth_headers):
+    from tasks import poll_user_changes
+
+    assert client.post("/api/totp/setup?format=uri", headers=auth_headers).status_code == 200
+    # TOTP включён другим процессом сервера: в кеше этого процесса снимок без секрета
+    user, _ = registered_user
+    user.totp_secret = pyotp.random_base32()
+    user.state_changed_at = datetime.utcnow()
+    db.commit()
+
+    assert asyncio.run(poll_user_changes()) == 1
+    assert client.post("/api/totp/setup?format=uri", headers=auth_headers).status_code == 400
+
+
+def test_stale_cached_user_does_not_break_totp(client, db, registered_user, auth_headers):
+    setup = client.post("/api/totp/setup?format=uri", headers=auth_headers).json()
+    # Включение TOTP в другом процессе, о котором опрос изменений ещё не сообщил
+    user, _ = registered_user
+    user.totp_secret = pyotp.random_base32()
+    db.commit()
+
+    # Подтверждение не перезаписывает секрет, а проверка кода перечитывает пользователя из БД
+    code = pyotp.TOTP(setup["secret"]).now()
+    assert client.post("/api/totp/setup/verify", json={"code": code}, headers=auth_headers).status_code == 400
+    db.refresh(user)
+    assert user.totp_secret != setup["secret"]
+    code = pyotp.TOTP(user.totp_secret).now()
+    assert client.post("/api/totp/verify", json={"code": code}, headers=auth_headers).status_code == 200
+
+
+def test_login_with_totp_requires_verification(client, db, registered_user):
+    user, password = registered_user
+    secret = pyotp.random_base32()
+    user.totp_secret = secret
+    db.commit()
+
+    login = client.post("/api/login", json={"login": user.login, "password": password}).json()
+    assert login["message"] == "TOTP required"
+    headers = {"Authorization": f"Bearer {login['token']}"}
+    response = client.get("/api/user", headers=headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "TOTP verification required"
+
+    # Неверный код - 400: 401 остаётся только для ошибок токена
+    response = client.post("/api/totp/verify", json={"code": "000000"}, headers=headers)
+    assert response.status_code == 400
+
+    response = client.post("/api/totp/verify", json={"code": pyotp.TOTP(secret).now()}, headers=headers)
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    assert client.get("/api/user", headers=headers).json()["totp_enabled"] is True
+
+    # Пройденный второй фактор сохраняется в сессии и переживает обновление токена
+    refreshed = client.post("/api/token/refresh", json={"refresh_token": login["refresh_token"]})
+    headers = {"Authorization": f"Bearer {refreshed.json()['token']}"}
+    assert client.get("/api/user", headers=headers).status_code == 200
+
+
+def test_setup_totp_formats(client, auth_headers):
+    png = client.post("/api/totp/setup", headers=auth_headers).json()
+    assert png["qr_code"].startswith("data:image/png;base64,")
+    assert png["provisioning_uri"].startswith("otpauth://totp/")
+
+    # Незавершённая настройка переиспользует секрет
+    svg = client.post("/api/totp/setup?format=svg", headers=auth_headers).json()
+    assert svg["secret"] == png["secret"]
+    assert svg["qr_code"].startswith("data:image/svg+xml;utf8,")
+
+    uri = client.post("/api/totp/setup?format=uri", headers=auth_headers).json()
+    assert uri["qr_code"] is None
+    assert uri["provisioning_uri"] == png["provisioning_uri"]
+
+
+def test_setup_totp_qr_is_cached(client, auth_headers):
+    from totp_utils import qr_cache
+
+    client.post("/api/totp/setup?format=svg", headers=auth_headers)
+    hits = qr_cache.hits
+    client.post("/api/totp/setup?format=svg", headers=auth_headers)
+    assert qr_cache.hits == hits + 1
+
+
+def test_verify_totp_batch(client, db, registered_user, monkeypatch):
+    from settings import settings
+    from src.models import User
+
+    monkeypatch.setattr(settings, "TOTP_GATEWAY_KEY", "gateway-secret")
+    user, _ = registered_user
+    secret = pyotp.random_base32()
+    user.totp_secret = secret
+    db.add(User(login="no-totp", password_hash="fake_hash"))
+    db.commit()
+
+    code = pyotp.TOTP(secret).now()
+    response = client.post(
+        "/api/totp/verify/batch",
+        json={"items": [
+            {"login": user.login, "code": code},
+            {"login": user.login, "code": "000000" if code != "000000" else "111111"},
+            {"login": "no-totp", "code": code},
+            {"login": "missing", "code": code},
+        ]},
+        headers={"X-Gateway-Key": "gateway-secret"}
+    )
+    assert response.status_code == 200
+    assert [r["valid"] for r in response.json()["results"]] == [True, False, False, False]
+
+
+def test_verify_totp_batch_requires_gateway_key(client, monkeypatch):
+    from settings import settings
+
+    monkeypatch.setattr(settings, "TOTP_GATEWAY_KEY", "gateway-secret")
+    response = client.post("/api/totp/verify/batch", json={"items": []}, headers={"X-Gateway-Key": "wrong"})
+    assert response.status_code == 403
+
+    monkeypatch.setattr(settings, "TOTP_GATEWAY_KEY", None)
+    response = client.post("/api/totp/verify/batch", json={"items": []}, headers={"X-Gateway-Key": ""})
+    assert response.status_code == 403
+
+
+def test_verify_totp_code_matches_pyotp():
+    import time
+    from totp_utils import verify_totp_code, verify_totp_codes
+
+    secret = pyotp.random_base32()
+    totp = pyotp.TOTP(secret)
+    now = time.time()
+    for shift in (-30, 0, 30):
+        assert verify_totp_code(secret, totp.at(now + shift))
+    assert verify_totp_codes([(secret, totp.at(now + 90))], for_time=now) == [False]
+    assert verify_totp_code(secret, "не код") is False
+
+
+def test_verify_totp_codes_async_counts_results():
+    from totp_utils import TOTP_VERIFICATIONS, verify_totp_codes_async
+
+    secret = pyotp.random_base32()
+    valid = TOTP_VERIFICATIONS._values.get(("valid",), 0)
+    items = ((secret, code) for code in (pyotp.TOTP(secret).now(), "000000"))
+    results = asyncio.run(verify_totp_codes_async(items))
+    # Генератор разобран до передачи в поток, счётчик обновлён после проверки
+    assert results[0] is True
+    assert TOTP_VERIFICATIONS._values[("valid",)] == valid + sum(results)
+
+
+def test_purge_expired_pending_totp(db, registered_user):
+    import asyncio
+    from datetime import datetime, timedelta
+    from src.models import PendingTotp, User
+    from tasks import purge_expired_pending_totp
+
+    user, _ = registered_user
+    old = datetime.utcnow() - timedelta(hours=1)
+    for i in range(5):
+        abandoned = User(login=f"abandoned-{i}", password_hash="fake_hash")
+        db.add(abandoned)
+        db.flush()
+        db.add(PendingTotp(user_id=abandoned.id, pending_totp_secret="SECRET", created_at=old))
+    db.add(PendingTotp(user_id=user.id, pending_totp_secret="FRESH"))
+    db.commit()
+
+    assert asyncio.run(purge_expired_pending_totp(2)) == 5
+    assert [p.pending_totp_secret for p in db.query(PendingTotp).all()] == ["FRESH"]
@@ -0,0 +1,60 @@
+import axios from 'axios'
+
+// Access-токен живёт недолго: при 401 один раз обновляем его по refresh-токену и повторяем запрос.
+// Бэкенд отвечает 401 только на недействительный токен (неверный TOTP-код - 400), так что повтор
+// не отправляет код второй раз
+const api = axios.create()
+
+export function saveTokens({ token, refresh_token }) {
+  if (token) localStorage.setItem('token', token)
+  if (refresh_token) localStorage.setItem('refresh_token', refresh_token)
+}
+
+export function clearTokens() {
+  localStorage.removeItem('token')
+  localStorage.removeItem('refresh_token')
+}
+
+api.interceptors.request.use((config) => {
+  const token = localStorage.getItem('token')
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`
+  }
+  return config
+})
+
+// Одно обновление на все запросы, получившие 401 одновременно
+let refreshing = null
+
+function refreshTokens() {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refresh_token')
+    refreshing = (refreshToken
+      ? axios.post('/api/token/refresh', { refresh_token: refreshToken }).then((response) => saveTokens(response.data))
+      : Promise.reject(new Error('No refresh token'))
+    ).finally(() => {
+      refreshing = null
+    })
+  }
+  return refreshing
+}
+
+api.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const original = error.config
+    if (error.response?.status !== 401 || original._retried || original.url === '/api/login') {
+      throw error
+    }
+    original._retried = true
+    try {
+      await refreshTokens()
+    } catch {
+      clearTokens()
+      throw error
+    }
+    return api(original)
+  }
+)
+
+export default api
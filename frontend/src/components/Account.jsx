@@ -1,12 +1,13 @@
 import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import '../styles/account.css';
-import axios from 'axios';
+import api, { clearTokens, saveTokens } from '../api';
 
 function Account() {
   const [username, setUsername] = useState('username');
   const [signupDate, setSignupDate] = useState('07-12-2025');
   const [sessions, setSessions] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [totpEnabled, setTotpEnabled] = useState(false); 
   const [showTOTPPopup, setShowTOTPPopup] = useState(false);
   const [showVerifyPopup, setShowVerifyPopup] = useState(false); 
@@ -58,50 +59,47 @@ function Account() {
 
   const loadUserData = async () => {
     try {
-      const response = await axios.get('/api/user', {
-        headers: {
-          Authorization: `Bearer ${localStorage.getItem('token')}`,
-        },
-      });
+      const response = await api.get('/api/user');
       setUsername(response.data.username);
       setSignupDate(response.data.signup_date);
       setTotpEnabled(response.data.totp_enabled); 
     } catch (err) {
       console.error('Ошибка загрузки данных пользователя:', err);
       if (err.response?.status === 401) {
-        localStorage.removeItem('token');
+        clearTokens();
         navigate('/login');
+      } else if (err.response?.status === 403) {
+        // Сессия ещё не прошла второй фактор
+        navigate('/totp');
       }
     }
   };
 
-  const loadSessions = async () => {
+  const loadSessions = async (cursor = null) => {
     try {
-      const response = await axios.get('/api/sessions', {
-        headers: {
-          Authorization: `Bearer ${localStorage.getItem('token')}`,
-        },
+      const response = await api.get('/api/sessions', {
+        params: cursor ? { cursor } : {},
       });
-      setSessions(response.data.sessions || []);
+      const page = response.data.sessions || [];
+      setSessions((prev) => (cursor ? [...prev, ...page] : page));
+      setNextCursor(response.data.next_cursor || null);
     } catch (err) {
       console.error('Ошибка загрузки сессий:', err);
       if (err.response?.status === 401) {
-        localStorage.removeItem('token');
+        clearTokens();
         navigate('/login');
+      } else if (err.response?.status === 403) {
+        // Сессия ещё не прошла второй фактор
+        navigate('/totp');
       }
     }
   };
 
   const handleEnableTOTP = async () => {
     try {
-      const response = await axios.post(
+      const response = await api.post(
         '/api/totp/setup',
-        {},
-        {
-          headers: {
-            Authorization: `Bearer ${localStorage.getItem('token')}`,
-          },
-        }
+        {}
       );
       setTotpSecret(response.data.secret);
       setQrCode(response.data.qr_code);
@@ -150,16 +148,13 @@ function Account() {
     if (code.length !== 6) return;
 
     try {
-      await axios.post(
+      const response = await api.post(
         '/api/totp/setup/verify',
-        { code },
-        {
-          headers: {
-            Authorization: `Bearer ${localStorage.getItem('token')}`,
-          },
-        }
+        { code }
       );
 
+      // Токен с отметкой о пройденном втором факторе
+      saveTokens(response.data);
       alert('TOTP успешно подключен');
       setTotpEnabled(true);
       closeAllPopups();
@@ -180,17 +175,22 @@ function Account() {
 
   const terminateSession = async (sessionId) => {
     try {
-      await axios.delete(`/api/sessions/${sessionId}`, {
-        headers: {
-          Authorization: `Bearer ${localStorage.getItem('token')}`,
-        },
-      });
+      await api.delete(`/api/sessions/${sessionId}`);
       loadSessions();
     } catch (err) {
       console.error('Ошибка завершения сессии:', err);
     }
   };
 
+  const terminateOtherSessions = async () => {
+    try {
+      await api.post('/api/sessions/terminate-others');
+      loadSessions();
+    } catch (err) {
+      console.error('Ошибка завершения сессий:', err);
+    }
+  };
+
   return (
     <>
       <div className="account-page">
@@ -219,6 +219,14 @@ function Account() {
 
         <div className="sessions-container">
           <h2 className="sessions-title">Сессии</h2>
+          {sessions.length > 1 && (
+            <button
+              className="load-more-sessions"
+              onClick={terminateOtherSessions}
+            >
+              Завершить остальные сессии
+            </button>
+          )}
           {sessions.map((session, index) => (
             <div
               key={session.id || index}
@@ -245,6 +253,14 @@ function Account() {
               )}
             </div>
           ))}
+          {nextCursor && (
+            <button
+              className="load-more-sessions"
+              onClick={() => loadSessions(nextCursor)}
+            >
+              Показать ещё
+            </button>
+          )}
         </div>
 
         {/* Попап 1: QR-код */}
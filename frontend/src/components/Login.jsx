@@ -2,6 +2,7 @@ import { useState } from 'react'
 import { Link, useNavigate } from 'react-router-dom'
 import '../styles/login.css'
 import axios from 'axios'
+import { saveTokens } from '../api'
 
 function Login() {
   const [login, setLogin] = useState('')
@@ -21,9 +22,7 @@ function Login() {
         password
       })
       
-      if (response.data.token) {
-        localStorage.setItem('token', response.data.token)
-      }
+      saveTokens(response.data)
       
       // Если требуется TOTP, перенаправляем на страницу TOTP
       if (response.data.message === 'TOTP required') {
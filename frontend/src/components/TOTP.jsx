@@ -2,7 +2,7 @@ import { useState, useRef, useEffect, useCallback } from 'react'
 import { useNavigate } from 'react-router-dom'
 import '../styles/login.css'
 import '../styles/totp.css'
-import axios from 'axios'
+import api, { saveTokens } from '../api'
 
 function TOTP() {
   const [digits, setDigits] = useState(['', '', '', '', '', ''])
@@ -68,16 +68,14 @@ function TOTP() {
 
     setIsSubmitting(true)
     try {
-      const response = await axios.post('/api/totp/verify', {
+      const response = await api.post('/api/totp/verify', {
         code
-      }, {
-        headers: {
-          Authorization: `Bearer ${localStorage.getItem('token')}`
-        }
       })
       
       // Если успешно, перенаправляем на account
       if (response.data.success) {
+        // Новый токен отмечает сессию как прошедшую второй фактор
+        saveTokens(response.data)
         navigate('/account')
       }
     } catch (err) {
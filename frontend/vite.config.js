@@ -9,7 +9,9 @@ export default defineConfig({
     proxy: {
       '/api': {
         target: 'http://backend:8000',
-        changeOrigin: true
+        changeOrigin: true,
+        // Бэкенд видит адрес браузера, а не контейнера frontend
+        xfwd: true
       }
     }
   }